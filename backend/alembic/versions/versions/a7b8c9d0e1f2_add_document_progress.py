@@ -0,0 +1,28 @@
+"""add document progress
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-16 12:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'a7b8c9d0e1f2'
+down_revision: Union[str, None] = 'f6a7b8c9d0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('pages_extracted', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('documents', sa.Column('chunks_embedded', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('documents', sa.Column('chunks_total', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('documents', 'chunks_total')
+    op.drop_column('documents', 'chunks_embedded')
+    op.drop_column('documents', 'pages_extracted')
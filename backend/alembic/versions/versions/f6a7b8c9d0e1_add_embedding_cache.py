@@ -0,0 +1,34 @@
+"""add embedding cache
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-16 11:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'f6a7b8c9d0e1'
+down_revision: Union[str, None] = 'e5f6a7b8c9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('embedding_cache',
+        sa.Column('model', sa.String(length=255), nullable=False),
+        sa.Column('prefix', sa.String(length=64), nullable=False),
+        sa.Column('text_sha256', sa.String(length=64), nullable=False),
+        sa.Column('embedding', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_used_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('model', 'prefix', 'text_sha256'),
+    )
+    op.create_index('ix_embedding_cache_last_used_at', 'embedding_cache', ['last_used_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_embedding_cache_last_used_at', table_name='embedding_cache')
+    op.drop_table('embedding_cache')
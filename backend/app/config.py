@@ -13,12 +13,106 @@ class Settings(BaseSettings):
     chunk_size: int = 512
     chunk_overlap: int = 64
     top_k: int = 10
+    # Conversation history sent with each question
+    history_token_budget: int = 1500
+    history_max_messages: int = 20
+    history_summary_min_messages: int = 6
+    history_summary_max_chars: int = 2000
+    context_token_budget: int = 3000
+    context_chars_per_token: float = 4.0
+    context_min_source_tokens: int = 64
+    retrieval_mode: str = "hybrid"  # "hybrid" or "dense"
+    hybrid_prefetch_multiplier: int = 4
+    retrieval_cache_enabled: bool = True
+    retrieval_cache_max_entries: int = 1024
+    retrieval_cache_ttl_seconds: int = 600
+    answer_cache_enabled: bool = True
+    answer_cache_max_entries: int = 2048
+    answer_cache_max_bytes: int = 64 * 1024 * 1024
+    answer_cache_ttl_seconds: int = 7 * 24 * 3600
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    bm25_avg_doc_tokens: float = 90.0
+    vector_backend: str = "qdrant"  # "qdrant" or "numpy" (embedded, for single-node installs)
+    numpy_index_dir: str = ""  # defaults to a "vectors" directory next to upload_dir
+    numpy_index_max_segments: int = 64
     qdrant_collection: str = "counselai_chunks"
+    qdrant_prefer_grpc: bool = False
+    qdrant_grpc_port: int = 6334
+    qdrant_timeout: int = 30
+    qdrant_hnsw_m: int = 16
+    qdrant_hnsw_ef_construct: int = 100
+    qdrant_hnsw_payload_m: int = 16
+    qdrant_on_disk_vectors: bool = False
+    qdrant_quantization: str = "none"  # "none", "scalar" (int8) or "binary"
+    qdrant_quantization_always_ram: bool = True
+    qdrant_search_rescore: bool = True
+    qdrant_search_oversampling: float = 2.0
+
+    ollama_max_connections: int = 32
+    ollama_max_keepalive_connections: int = 16
+    ollama_keepalive_expiry: float = 60.0
+    ollama_http2: bool = True
+    ollama_connect_timeout: float = 5.0
+    ollama_embed_timeout: float = 120.0
+    ollama_chat_timeout: float = 300.0
+    ollama_title_timeout: float = 30.0
+    ollama_summary_timeout: float = 120.0
+    # How long Ollama keeps a model loaded after each call ("30m", "-1" = forever)
+    ollama_keep_alive: str = "30m"
+    ollama_warmup_on_startup: bool = True
+    # Seconds between keep-warm pings; 0 disables the task
+    ollama_keep_warm_interval: int = 0
+    # Seconds between background first-token latency probes (reported by /api/ready); 0 disables.
+    # A probe is a real generation that restarts the keep-alive timer, so it is skipped
+    # unless the LLM was used since the previous one
+    ollama_ready_probe_interval: int = 0
+    ollama_probe_timeout: float = 10.0
+    # Chat generation admission control
+    llm_max_concurrency: int = 2
+    llm_max_queue: int = 32
+    llm_max_queue_per_user: int = 4
+    # Chat stream token coalescing defaults (per-request overrides in MessageCreate)
+    stream_flush_interval_ms: int = 50
+    stream_flush_max_bytes: int = 512
+    # How often a chat stream checks whether its client is still connected
+    stream_disconnect_poll_interval: float = 1.0
+    # Detached generations: events kept for resuming a dropped stream, how long an
+    # unfollowed generation waits for its client to reattach, and how long a finished
+    # one stays resumable
+    generation_buffer_events: int = 1024
+    generation_resume_grace_seconds: float = 30.0
+    generation_retention_seconds: float = 300.0
+
+    ingestion_in_process_workers: bool = True
+    ingestion_concurrency: int = 2
+    ingestion_lease_seconds: int = 120
+    ingestion_heartbeat_seconds: int = 30
+    ingestion_poll_interval: float = 2.0
+    ingestion_max_attempts: int = 3
+
+    ingestion_queue_size: int = 512
+    qdrant_upsert_batch_size: int = 256
+
+    extraction_workers: int = 2
+    extraction_pages_per_task: int = 50
+
+    embedding_batch_size: int = 32
+    embedding_concurrency: int = 4
+    embedding_max_retries: int = 3
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 1_000_000
+    embedding_cache_evict_interval: int = 300
+    # Seconds between batched last_used_at writes for cache hits
+    embedding_cache_touch_interval: int = 60
 
     secret_key: str
     allowed_origins: str = "http://localhost:3000"
     access_token_expire_minutes: int = 480
-    max_upload_size_mb: int = 300
+    max_upload_size_mb: int = 300  # per file
+    # Whole upload request, which may carry several files; keep nginx's client_max_body_size in step
+    max_upload_request_mb: int = 2048
+    upload_block_size: int = 1024 * 1024
     max_failed_logins: int = 5
     lockout_duration_minutes: int = 15
 
@@ -8,7 +8,7 @@ from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 from app.config import settings
-from app.middleware import SecurityHeadersMiddleware
+from app.middleware import SecurityHeadersMiddleware, UploadSizeLimitMiddleware
 from app.rate_limit import limiter
 from app.routers import admin, auth, cases, documents, chat
 
@@ -17,10 +17,29 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    from app.services.vector_store import init_collection
+    from app.services import extraction, generations, history, ollama, titling, vector_store
+    from app.services.jobs import IngestionWorkerPool
 
-    await init_collection()
-    yield
+    await ollama.init_client()
+    ollama.start_keep_warm(warm_up_first=settings.ollama_warmup_on_startup)
+    await vector_store.init_client()
+    await vector_store.init_collection()
+    workers = None
+    if settings.ingestion_in_process_workers:
+        workers = IngestionWorkerPool(settings.ingestion_concurrency)
+        await workers.start()
+    try:
+        yield
+    finally:
+        if workers:
+            await workers.stop()
+        await generations.shutdown()
+        await titling.shutdown()
+        await history.shutdown()
+        await ollama.stop_keep_warm()
+        await ollama.close_client()
+        await vector_store.close_client()
+        extraction.shutdown_executor()
 
 
 app = FastAPI(title="CounselAI", lifespan=lifespan)
@@ -28,12 +47,15 @@ app = FastAPI(title="CounselAI", lifespan=lifespan)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Caps the whole request; each file is held to max_upload_size_mb as it is saved
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=settings.max_upload_request_mb * 1024 * 1024)
 app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.allowed_origins.split(","),
     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
-    allow_headers=["Authorization", "Content-Type"],
+    allow_headers=["Authorization", "Content-Type", "Last-Event-ID"],
+    expose_headers=["X-Generation-Id"],
     allow_credentials=True,
 )
 
@@ -52,4 +74,14 @@ async def global_exception_handler(request: Request, exc: Exception) -> JSONResp
 
 @app.get("/api/health")
 async def health():
+    """Liveness only; see /api/ready for model state."""
     return {"status": "ok"}
+
+
+@app.get("/api/ready")
+async def ready():
+    """Readiness: Ollama reachable with the chat and embedding models loaded."""
+    from app.services import ollama
+
+    status = await ollama.readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
@@ -1,8 +1,10 @@
 from app.models.base import Base
 from app.models.case import Case
 from app.models.document import Document
+from app.models.embedding_cache import EmbeddingCacheEntry
+from app.models.ingestion_job import IngestionJob
 from app.models.conversation import Conversation
 from app.models.message import Message
 from app.models.user import User
 
-__all__ = ["Base", "Case", "Document", "Conversation", "Message", "User"]
+__all__ = ["Base", "Case", "Document", "EmbeddingCacheEntry", "IngestionJob", "Conversation", "Message", "User"]
@@ -15,7 +15,11 @@ class Document(Base):
     filename: Mapped[str] = mapped_column(String(255))
     filepath: Mapped[str] = mapped_column(String(512))
     file_size: Mapped[int] = mapped_column(Integer)
+    content_sha256: Mapped[str | None] = mapped_column(String(64), nullable=True)
     page_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    pages_extracted: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    chunks_embedded: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    chunks_total: Mapped[int | None] = mapped_column(Integer, nullable=True)
     status: Mapped[str] = mapped_column(String(20), default="pending")
     error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
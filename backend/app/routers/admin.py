@@ -6,6 +6,13 @@ from app.database import get_db
 from app.dependencies import require_superadmin
 from app.models.user import User
 from app.schemas.auth import UserResponse
+from app.services import generations
+from app.services.answer_cache import cache_stats as answer_cache_stats
+from app.services.embedding_cache import cache_stats as embedding_cache_stats
+from app.services.llm_scheduler import get_scheduler
+from app.services.ollama import pool_stats
+from app.services.rag import generation_stats
+from app.services.retrieval_cache import cache_stats as retrieval_cache_stats
 from app.services.security_logger import log_admin_action
 
 router = APIRouter(tags=["admin"])
@@ -20,6 +27,18 @@ async def list_users(
     return result.scalars().all()
 
 
+@router.get("/admin/stats")
+async def get_stats(_admin: User = Depends(require_superadmin)):
+    return {
+        "ollama_pool": pool_stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "retrieval_cache": retrieval_cache_stats(),
+        "answer_cache": answer_cache_stats(),
+        "llm_scheduler": get_scheduler().stats(),
+        "generation": {**generation_stats(), **generations.stats()},
+    }
+
+
 @router.patch("/admin/users/{user_id}/disable", response_model=UserResponse)
 async def disable_user(
     user_id: str,
@@ -1,12 +1,13 @@
+import asyncio
 import json
 import logging
 import re
+from dataclasses import asdict
 from datetime import datetime, timezone
 
-import httpx
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
 from fastapi.responses import Response, StreamingResponse
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
@@ -22,8 +23,23 @@ from app.schemas.chat import (
     MessageCreate,
     MessageResponse,
 )
+from app.services import conversation_events, generations
 from app.services.export import generate_markdown, generate_pdf
-from app.services.rag import stream_rag_response, extract_citations, embed_query, search_chunks
+from app.services.generations import Generation, ResumeUnavailable
+from app.services.history import load_history, schedule_summary
+from app.services.llm_scheduler import SchedulerOverloaded, get_scheduler
+from app.services.rag import lookup_answer, replay_answer, retrieve_chunks, stream_rag_response
+from app.services.stream_events import (
+    CitationEvent,
+    ClientDisconnected,
+    DoneEvent,
+    FlushPolicy,
+    TokenEvent,
+    coalesce_tokens,
+    until_disconnected,
+)
+from app.services.timing import StageTimings
+from app.services.titling import heuristic_title, schedule_title
 
 logger = logging.getLogger(__name__)
 
@@ -77,6 +93,8 @@ async def get_messages(conv_id: str, _user: User = Depends(get_current_user), db
             role=msg.role,
             content=msg.content,
             citations=msg.citations if isinstance(msg.citations, list) else [],
+            interrupted=msg.interrupted,
+            error=msg.error,
             created_at=msg.created_at,
         ))
     return response
@@ -118,61 +136,203 @@ async def export_conversation(
 
 
 @router.post("/conversations/{conv_id}/messages")
-async def send_message(conv_id: str, body: MessageCreate, _user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def send_message(
+    conv_id: str,
+    body: MessageCreate,
+    request: Request,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    timings = StageTimings()
     conv = await db.get(Conversation, conv_id)
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    # Save user message
-    user_msg = Message(conversation_id=conv_id, role="user", content=body.content, citations=[])
-    db.add(user_msg)
-    await db.commit()
+    # A cached answer is replayed without generating, so it needs no queue place
+    answer_key, cached = None, None
+    if body.use_answer_cache and settings.answer_cache_enabled:
+        with timings.stage("answer_cache"):
+            answer_key, cached = await lookup_answer(conv.case_id, body.content)
+
+    # Take a place in the generation queue before saving anything, so an overloaded
+    # server rejects the request cleanly
+    ticket = None
+    if cached is None:
+        try:
+            ticket = get_scheduler().enqueue(user.id)
+        except SchedulerOverloaded:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many chat requests are waiting, please retry shortly",
+                headers={"Retry-After": "10"},
+            )
 
-    # Get conversation history
-    result = await db.execute(
-        select(Message).where(Message.conversation_id == conv_id).order_by(Message.created_at.asc())
+    # Retrieval only needs the question, so embed and search while the DB work runs
+    async def retrieve() -> list[dict]:
+        with timings.stage("retrieval"):
+            return await retrieve_chunks(conv.case_id, body.content, timings=timings)
+
+    retrieval = asyncio.create_task(retrieve()) if cached is None else None
+    try:
+        with timings.stage("db"):
+            # Recent history (loaded before the new message is saved, so it is excluded)
+            history = await load_history(db, conv)
+
+            # Save user message
+            user_msg = Message(conversation_id=conv_id, role="user", content=body.content, citations=[])
+            db.add(user_msg)
+
+            # Title a new conversation right away; an LLM title replaces it after the answer
+            provisional_title = None
+            if not history.messages:
+                provisional_title = heuristic_title(body.content)
+                conv.title = provisional_title
+            await db.commit()
+    except BaseException:
+        if retrieval is not None:
+            retrieval.cancel()
+        if ticket is not None:
+            ticket.release()
+        raise
+
+    # `produce` runs the pipeline, publishes its events and saves the assistant message
+    flush_policy = FlushPolicy(
+        interval_ms=settings.stream_flush_interval_ms if body.flush_interval_ms is None else body.flush_interval_ms,
+        max_bytes=settings.stream_flush_max_bytes if body.flush_max_bytes is None else body.flush_max_bytes,
     )
-    messages = result.scalars().all()
-    history = [{"role": m.role, "content": m.content} for m in messages[:-1]]  # exclude the just-added message
 
-    # We need to save the assistant message after streaming completes.
-    # Wrap the generator to capture and save the response.
-    async def generate():
+    async def produce(gen: Generation):
         full_content = ""
         citations = []
-        async for event in stream_rag_response(conv.case_id, body.content, history):
-            yield event
-            # Parse the SSE data to capture final content
-            if event.startswith("data: "):
-                try:
-                    data = json.loads(event[6:].strip())
-                    if data.get("type") == "done":
-                        full_content = data.get("content", full_content)
-                        citations = data.get("citations", [])
-                except (json.JSONDecodeError, KeyError):
-                    pass
+        source = None
+        parts: list[str] = []
+        found: list[dict] = []
+        try:
+            if cached is not None:
+                source = replay_answer(cached, timings)
+            else:
+                # Awaited here so a retrieval failure is reported and saved like any other
+                chunks = await retrieval
+                source = stream_rag_response(
+                    conv.case_id,
+                    body.content,
+                    history.messages,
+                    ticket,
+                    answer_key,
+                    history_summary=history.earlier_context,
+                    chunks=chunks,
+                    timings=timings,
+                )
+            async for event in coalesce_tokens(source, flush_policy):
+                gen.emit(event)
+                if isinstance(event, TokenEvent):
+                    parts.append(event.content)
+                elif isinstance(event, CitationEvent):
+                    found.append(asdict(event))
+                elif isinstance(event, DoneEvent):
+                    full_content = event.content
+                    citations = event.citations
+        except asyncio.CancelledError:
+            # No client reattached in time (or the server is stopping); keep what was produced
+            logger.info(f"Generation {gen.id} for conversation {conv_id} cancelled after {len(parts)} chunks")
+            partial_citations = sorted(found, key=lambda c: c["source_index"])
+            await _save_assistant_message(conv_id, "".join(parts), partial_citations, interrupted=True)
+            if provisional_title is not None:
+                schedule_title(conv_id, body.content, provisional_title)
+            raise
+        except Exception:
+            # Record the failure with whatever arrived; the generation emits the error event
+            partial_citations = sorted(found, key=lambda c: c["source_index"])
+            try:
+                await _save_assistant_message(
+                    conv_id, "".join(parts), partial_citations, error=generations.GENERATION_FAILED_MESSAGE
+                )
+            except Exception:
+                logger.exception(f"Failed to save the failed answer for conversation {conv_id}")
+            raise
+        finally:
+            # The RAG stream releases the ticket once started; before that it is ours to release
+            if source is None:
+                if retrieval is not None:
+                    retrieval.cancel()
+                if ticket is not None:
+                    ticket.release()
 
         # Save assistant message after stream completes
-        async with (await _get_session()) as save_db:
-            assistant_msg = Message(
-                conversation_id=conv_id,
-                role="assistant",
-                content=full_content,
-                citations=citations,
-            )
-            save_db.add(assistant_msg)
-            await save_db.commit()
+        await _save_assistant_message(conv_id, full_content, citations)
 
-            # Auto-title on first exchange
-            msg_count = await save_db.scalar(
-                select(func.count()).where(Message.conversation_id == conv_id)
-            )
-            if msg_count == 2:  # first user + first assistant
-                title = await _generate_title(body.content)
-                conv_obj = await save_db.get(Conversation, conv_id)
-                if conv_obj:
-                    conv_obj.title = title
-                    await save_db.commit()
+        if provisional_title is not None:
+            schedule_title(conv_id, body.content, provisional_title)
+        schedule_summary(conv_id, history)
+
+    # The answer is generated detached from this connection, so a dropped stream can
+    # be resumed from GET /conversations/{id}/stream
+    gen = generations.start(conv_id, user.id, produce)
+
+    # Stages finished by now; retrieval and streaming stages are reported in the done event
+    return StreamingResponse(
+        _follow(gen, request),
+        media_type="text/event-stream",
+        headers={"Server-Timing": timings.server_timing(), "X-Generation-Id": gen.id},
+    )
+
+
+@router.get("/conversations/{conv_id}/stream")
+async def resume_stream(
+    conv_id: str,
+    request: Request,
+    resume: str | None = Query(None, description="Generation id; defaults to the one in Last-Event-ID, then the latest"),
+    last_event_id: str | None = Header(None),
+    _user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Reattach to a chat answer: replay the events after Last-Event-ID, then follow it live."""
+    # The user lookup used this request's session; release it before a stream that
+    # may last as long as the answer
+    await db.close()
+    event_generation, after = generations.parse_event_id(last_event_id)
+    generation_id = resume or event_generation
+    gen = generations.get(generation_id) if generation_id else generations.latest(conv_id)
+    if gen is None or gen.conv_id != conv_id:
+        raise HTTPException(status_code=404, detail="No resumable answer for this conversation")
+    if gen.id != event_generation:
+        after = 0
+    try:
+        gen.check_resume(after)
+    except ResumeUnavailable:
+        raise HTTPException(status_code=410, detail="The answer has moved past the last event received; reload the conversation")
+    return StreamingResponse(
+        _follow(gen, request, after), media_type="text/event-stream", headers={"X-Generation-Id": gen.id}
+    )
+
+
+async def _follow(gen: Generation, request: Request, after: int = 0):
+    """Relay a generation's events until it ends or the client leaves; the generation carries on."""
+    frames = until_disconnected(gen.follow(after), request.is_disconnected, settings.stream_disconnect_poll_interval)
+    try:
+        async for frame in frames:
+            yield ": keep-alive\n\n" if frame is None else frame
+    except ClientDisconnected:
+        logger.info(f"Client detached from generation {gen.id} of conversation {gen.conv_id}")
+
+
+@router.get("/conversations/{conv_id}/events")
+async def conversation_events_stream(
+    conv_id: str, _user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)
+):
+    """SSE stream of updates made after a chat stream closes, such as the generated title."""
+    if not await db.get(Conversation, conv_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    # The stream stays open for as long as the conversation is on screen; don't hold
+    # a pooled connection for it
+    await db.close()
+
+    async def generate():
+        async for event in conversation_events.subscribe(conv_id):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps(event)}\n\n"
 
     return StreamingResponse(generate(), media_type="text/event-stream")
 
@@ -225,32 +385,17 @@ async def _get_session():
     return async_session()
 
 
-async def _generate_title(user_message: str) -> str:
-    """Use the LLM to generate a short conversation title from the first message."""
-    try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.post(
-                f"{settings.ollama_url}/api/chat",
-                json={
-                    "model": settings.chat_model,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "Generate a short title (3-6 words) for a conversation that starts with the following message. Reply with ONLY the title, no quotes or punctuation.",
-                        },
-                        {"role": "user", "content": user_message},
-                    ],
-                    "stream": False,
-                },
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            title = data["message"]["content"].strip().strip('"').strip("'")
-            # Truncate if too long
-            if len(title) > 80:
-                title = title[:77] + "..."
-            return title
-    except Exception as e:
-        logger.warning(f"Failed to generate title: {e}")
-        # Fallback: first 50 chars of the message
-        return user_message[:50] + ("..." if len(user_message) > 50 else "")
+async def _save_assistant_message(
+    conv_id: str, content: str, citations: list[dict], interrupted: bool = False, error: str | None = None
+) -> None:
+    async with (await _get_session()) as save_db:
+        assistant_msg = Message(
+            conversation_id=conv_id,
+            role="assistant",
+            content=content,
+            citations=citations,
+            interrupted=interrupted,
+            error=error,
+        )
+        save_db.add(assistant_msg)
+        await save_db.commit()
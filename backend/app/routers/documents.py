@@ -1,10 +1,12 @@
-import asyncio
+import hashlib
 import os
 import re
+import tempfile
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from app.config import settings
 from app.database import get_db
@@ -13,6 +15,8 @@ from app.models.case import Case
 from app.models.document import Document
 from app.models.user import User
 from app.schemas.document import DocumentResponse
+from app.services.jobs import enqueue_ingestion, notify_workers
+from app.services.retrieval_cache import bump_corpus_version
 from app.services.security_logger import log_document_operation
 
 UUID_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.I)
@@ -25,6 +29,40 @@ def _validate_uuid(value: str, name: str) -> None:
         raise HTTPException(status_code=400, detail=f"Invalid {name} format")
 
 
+async def _stream_upload(file: UploadFile, dest_dir: str, max_bytes: int) -> tuple[str, int, str]:
+    """
+    Copy an upload into a temp file in dest_dir in fixed-size blocks, checking the PDF
+    header and per-file size limit as it goes. Returns (temp_path, size, sha256 hex
+    digest). The request body as a whole is capped before parsing by
+    UploadSizeLimitMiddleware (max_upload_request_mb); this enforces the per-file limit.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds {settings.max_upload_size_mb}MB limit: {file.filename}")
+
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".part")
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while block := await file.read(settings.upload_block_size):
+                if len(head) < 5:
+                    head += block[:5 - len(head)]
+                    if len(head) == 5 and head != b"%PDF-":
+                        raise HTTPException(status_code=400, detail=f"Only PDF files are accepted: {file.filename}")
+                size += len(block)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File exceeds {settings.max_upload_size_mb}MB limit: {file.filename}")
+                digest.update(block)
+                await run_in_threadpool(out.write, block)
+        if head != b"%PDF-":
+            raise HTTPException(status_code=400, detail=f"Only PDF files are accepted: {file.filename}")
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, size, digest.hexdigest()
+
+
 @router.post("/cases/{case_id}/documents", response_model=list[DocumentResponse], status_code=201)
 async def upload_documents(
     case_id: str,
@@ -38,45 +76,48 @@ async def upload_documents(
         raise HTTPException(status_code=404, detail="Case not found")
 
     max_bytes = settings.max_upload_size_mb * 1024 * 1024
+    upload_dir = os.path.join(settings.upload_dir, case_id)
+    os.makedirs(upload_dir, exist_ok=True)
 
     docs = []
-    for file in files:
-        content = await file.read()
-        if not content[:5].startswith(b"%PDF-"):
-            raise HTTPException(status_code=400, detail=f"Only PDF files are accepted: {file.filename}")
-
-        if len(content) > max_bytes:
-            raise HTTPException(status_code=413, detail=f"File exceeds {settings.max_upload_size_mb}MB limit: {file.filename}")
-
-        doc = Document(
-            case_id=case_id,
-            filename=file.filename,
-            filepath="",
-            file_size=0,
-        )
-        db.add(doc)
-        await db.flush()
+    saved_paths = []
+    try:
+        for file in files:
+            tmp_path, size, sha256 = await _stream_upload(file, upload_dir, max_bytes)
+            saved_paths.append(tmp_path)
+
+            doc = Document(
+                case_id=case_id,
+                filename=file.filename,
+                filepath="",
+                file_size=size,
+                content_sha256=sha256,
+            )
+            db.add(doc)
+            await db.flush()
+
+            filepath = os.path.join(upload_dir, f"{doc.id}.pdf")
+            os.replace(tmp_path, filepath)
+            saved_paths[-1] = filepath
+
+            doc.filepath = filepath
+            enqueue_ingestion(db, doc.id)
+            docs.append(doc)
+
+        await db.commit()
+    except BaseException:
+        # The documents were never committed, so don't leave their files behind
+        for path in saved_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
 
-        upload_dir = os.path.join(settings.upload_dir, case_id)
-        os.makedirs(upload_dir, exist_ok=True)
-        filepath = os.path.join(upload_dir, f"{doc.id}.pdf")
-
-        with open(filepath, "wb") as f:
-            f.write(content)
-
-        doc.filepath = filepath
-        doc.file_size = len(content)
-        docs.append(doc)
-
-    await db.commit()
     for doc in docs:
         await db.refresh(doc)
 
-    from app.services.ingestion import ingest_document
-
+    notify_workers()
     for doc in docs:
         log_document_operation(user.email, "upload", case_id, doc.id)
-        asyncio.create_task(ingest_document(doc.id))
 
     return docs
 
@@ -103,9 +144,10 @@ async def delete_document(case_id: str, doc_id: str, user: User = Depends(get_cu
 
     from app.services.vector_store import delete_document_vectors
 
-    delete_document_vectors(doc_id)
+    await delete_document_vectors(doc_id)
 
     log_document_operation(user.email, "delete", case_id, doc_id)
 
     await db.delete(doc)
+    await bump_corpus_version(db, case_id)
     await db.commit()
@@ -19,6 +19,11 @@ class ConversationResponse(BaseModel):
 
 class MessageCreate(BaseModel):
     content: str = Field(..., min_length=1, max_length=50000)
+    # Reuse a stored answer to the same question on the unchanged case, ignoring history
+    use_answer_cache: bool = False
+    # Token coalescing for the response stream; None uses the server defaults, 0/0 sends every token
+    flush_interval_ms: int | None = Field(default=None, ge=0, le=1000)
+    flush_max_bytes: int | None = Field(default=None, ge=0, le=65536)
 
 
 class CitationResponse(BaseModel):
@@ -34,6 +39,8 @@ class MessageResponse(BaseModel):
     role: str
     content: str
     citations: list[CitationResponse]
+    interrupted: bool = False
+    error: str | None = None
     created_at: datetime
 
     model_config = {"from_attributes": True}
@@ -9,6 +9,9 @@ class DocumentResponse(BaseModel):
     filename: str
     file_size: int
     page_count: int | None
+    pages_extracted: int
+    chunks_embedded: int
+    chunks_total: int | None
     status: str
     error_message: str | None
     created_at: datetime
@@ -0,0 +1,85 @@
+"""
+Opt-in cache of complete answers, for checklist questions rerun against an unchanged
+case. Entries are keyed by the corpus version, model and prompt template, so any of
+those changing makes old answers unreachable. Only answers generated without any
+conversation history are stored, since the key does not cover it; a lookup still
+ignores history, which is why clients must ask for the cache explicitly.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.config import settings
+from app.services.retrieval_cache import normalize_question
+
+AnswerKey = tuple[str, int, str, str, str]  # (case_id, corpus_version, normalized question, model, prompt hash)
+
+
+@dataclass
+class CachedAnswer:
+    content: str
+    citations: list[dict]
+    size: int
+    stored_at: float
+
+
+_entries: OrderedDict[AnswerKey, CachedAnswer] = OrderedDict()
+_bytes = 0
+_stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+
+def prompt_hash(template: str) -> str:
+    return hashlib.sha256(template.encode()).hexdigest()[:16]
+
+
+def answer_key(case_id: str, corpus_version: int, question: str, template_hash: str) -> AnswerKey:
+    return (case_id, corpus_version, normalize_question(question), settings.chat_model, template_hash)
+
+
+def get(key: AnswerKey) -> CachedAnswer | None:
+    entry = _entries.get(key)
+    if entry is None or time.monotonic() - entry.stored_at > settings.answer_cache_ttl_seconds:
+        if entry is not None:
+            _remove(key)
+        _stats["misses"] += 1
+        return None
+    _entries.move_to_end(key)
+    _stats["hits"] += 1
+    return entry
+
+
+def put(key: AnswerKey, content: str, citations: list[dict]) -> None:
+    global _bytes
+    size = len(content.encode()) + len(json.dumps(citations))
+    if size > settings.answer_cache_max_bytes:
+        return
+    if key in _entries:
+        _remove(key)
+    _entries[key] = CachedAnswer(content, citations, size, time.monotonic())
+    _bytes += size
+    _stats["stored"] += 1
+    while len(_entries) > settings.answer_cache_max_entries or _bytes > settings.answer_cache_max_bytes:
+        _remove(next(iter(_entries)))
+        _stats["evicted"] += 1
+
+
+def _remove(key: AnswerKey) -> None:
+    global _bytes
+    _bytes -= _entries.pop(key).size
+
+
+def invalidate_case(case_id: str) -> None:
+    for key in [k for k in _entries if k[0] == case_id]:
+        _remove(key)
+
+
+def cache_stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "entries": len(_entries),
+        "bytes": _bytes,
+        "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None,
+    }
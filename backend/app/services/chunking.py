@@ -1,8 +1,12 @@
 import re
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 
 from app.config import settings
 
+SENTENCE_END_RE = re.compile(r'[.!?]\s+')
+
 
 @dataclass
 class Chunk:
@@ -11,53 +15,116 @@ class Chunk:
     chunk_index: int
 
 
-def chunk_pages(pages: list[dict]) -> list[Chunk]:
+class ChunkStream:
+    """
+    Incremental chunker: feed pages in order and collect chunks as soon as their
+    boundaries are certain. Produces exactly the chunks `iter_chunks` would for the
+    same pages, while only buffering text from the current chunk onwards.
+
+    All offsets are positions in the virtual full text, which is every page's text
+    followed by a single space.
+    """
+
+    def __init__(self):
+        self._text = ""  # full text from offset self._base onwards
+        self._base = 0
+        self._length = 0
+        # Page k covers [page_starts[k], page_starts[k + 1]), including its trailing space
+        self._page_starts: list[int] = []
+        self._page_nums: list[int] = []
+        # Sentence ends that further text can no longer move, in ascending order
+        self._sentence_ends: list[int] = []
+        self._scan_pos = 0
+        self._start = 0
+        self._chunk_idx = 0
+        self._done = False
+
+    def feed(self, page: dict) -> list[Chunk]:
+        """Add a page ({"page": int, "text": str}) and return any chunks now complete."""
+        self._page_starts.append(self._length)
+        self._page_nums.append(page["page"])
+        self._text += page["text"] + " "  # space between pages
+        self._length += len(page["text"]) + 1
+        self._scan(final=False)
+        return self._emit(final=False)
+
+    def finish(self) -> list[Chunk]:
+        """Signal the end of the document and return the remaining chunks."""
+        self._scan(final=True)
+        return self._emit(final=True)
+
+    def _scan(self, final: bool) -> None:
+        # A match ending at the current end of text may still grow into following
+        # whitespace, so it is rescanned on the next feed rather than recorded.
+        resume = None
+        for m in SENTENCE_END_RE.finditer(self._text, self._scan_pos - self._base):
+            end = m.end() + self._base
+            if end < self._length or final:
+                self._sentence_ends.append(end)
+            else:
+                resume = m.start() + self._base
+        if resume is None:
+            # Nothing before the last character can start a new match any more
+            resume = max(self._scan_pos, self._length - 1)
+        self._scan_pos = resume
+
+    def _emit(self, final: bool) -> list[Chunk]:
+        chunks: list[Chunk] = []
+        while not self._done and self._start < self._length:
+            start = self._start
+            end = start + settings.chunk_size
+
+            if end >= self._length:
+                if not final:
+                    break  # the document may still extend past this chunk
+                end = self._length
+            else:
+                # Snap to the last sentence boundary in (start, end]
+                i = bisect_right(self._sentence_ends, end) - 1
+                if i >= 0 and self._sentence_ends[i] > start + settings.chunk_size // 2:
+                    end = self._sentence_ends[i]
+
+            chunk_text = self._text[start - self._base:end - self._base].strip()
+            if chunk_text:
+                first = bisect_right(self._page_starts, start) - 1
+                last = bisect_left(self._page_starts, end) - 1
+                chunks.append(Chunk(
+                    text=chunk_text,
+                    page_numbers=sorted(set(self._page_nums[first:last + 1])),
+                    chunk_index=self._chunk_idx,
+                ))
+                self._chunk_idx += 1
+
+            # An overlap as long as the chunk would never move forward; continue after it instead
+            next_start = end - settings.chunk_overlap
+            self._start = next_start if next_start > start else end
+            if self._start >= self._length or end == self._length:
+                self._done = True
+
+        self._discard_consumed()
+        return chunks
+
+    def _discard_consumed(self) -> None:
+        keep_from = min(self._start, self._scan_pos)
+        if keep_from > self._base:
+            self._text = self._text[keep_from - self._base:]
+            self._base = keep_from
+        i = bisect_right(self._sentence_ends, self._start)
+        if i:
+            del self._sentence_ends[:i]
+
+
+def iter_chunks(pages: Iterable[dict]) -> Iterator[Chunk]:
     """
-    Split page texts into overlapping chunks that respect sentence boundaries.
+    Lazily split page texts into overlapping chunks that respect sentence boundaries.
     Each page dict has {"page": int, "text": str}.
     """
-    # Build a flat list of (char, page_number) so we can track provenance
-    chars: list[tuple[str, int]] = []
+    stream = ChunkStream()
     for page in pages:
-        for ch in page["text"]:
-            chars.append((ch, page["page"]))
-        chars.append((" ", page["page"]))  # space between pages
-
-    full_text = "".join(c for c, _ in chars)
-    if not full_text.strip():
-        return []
-
-    # Find sentence boundaries
-    sentence_ends = [m.end() for m in re.finditer(r'[.!?]\s+', full_text)]
-    if not sentence_ends or sentence_ends[-1] < len(full_text):
-        sentence_ends.append(len(full_text))
-
-    chunks: list[Chunk] = []
-    start = 0
-    chunk_idx = 0
-
-    while start < len(full_text):
-        end = start + settings.chunk_size
-
-        if end >= len(full_text):
-            end = len(full_text)
-        else:
-            # Snap to nearest sentence boundary
-            best = None
-            for se in sentence_ends:
-                if se <= end and se > start:
-                    best = se
-            if best and best > start + settings.chunk_size // 2:
-                end = best
-
-        chunk_text = full_text[start:end].strip()
-        if chunk_text:
-            page_nums = sorted(set(chars[i][1] for i in range(start, min(end, len(chars)))))
-            chunks.append(Chunk(text=chunk_text, page_numbers=page_nums, chunk_index=chunk_idx))
-            chunk_idx += 1
-
-        start = end - settings.chunk_overlap
-        if start >= len(full_text) or end == len(full_text):
-            break
-
-    return chunks
+        yield from stream.feed(page)
+    yield from stream.finish()
+
+
+def chunk_pages(pages: list[dict]) -> list[Chunk]:
+    """Split page texts into overlapping chunks. See `iter_chunks`."""
+    return list(iter_chunks(pages))
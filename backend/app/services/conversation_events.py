@@ -0,0 +1,32 @@
+"""
+In-process pub/sub for conversation updates that happen after a chat stream has
+closed (e.g. the LLM-generated title). Subscribers only see events published by
+the same API process.
+"""
+import asyncio
+from collections.abc import AsyncIterator
+
+_subscribers: dict[str, set[asyncio.Queue]] = {}
+
+
+def publish(conv_id: str, event: dict) -> None:
+    for queue in _subscribers.get(conv_id, ()):
+        queue.put_nowait(event)
+
+
+async def subscribe(conv_id: str, heartbeat: float = 15.0) -> AsyncIterator[dict | None]:
+    """Yield events for a conversation as they are published, or None every `heartbeat` seconds."""
+    queue: asyncio.Queue = asyncio.Queue()
+    _subscribers.setdefault(conv_id, set()).add(queue)
+    try:
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+    finally:
+        subscribers = _subscribers.get(conv_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del _subscribers[conv_id]
@@ -1,20 +1,119 @@
+import asyncio
+import logging
+
 import httpx
 
 from app.config import settings
+from app.services import embedding_cache
+from app.services.ollama import get_client, timeout
 
+logger = logging.getLogger(__name__)
 
-async def embed_texts(texts: list[str], prefix: str = "search_document: ") -> list[list[float]]:
-    """Embed a batch of texts via Ollama. Adds the nomic-embed-text task prefix."""
-    embeddings = []
-    async with httpx.AsyncClient(timeout=120) as client:
-        for text in texts:
+
+class InputRejected(Exception):
+    """Ollama refused a batch because of its contents (a 4xx, or the wrong number of embeddings)."""
+
+
+def _rejected_by_input(e: Exception) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return 400 <= e.response.status_code < 500
+    return isinstance(e, ValueError)
+
+
+async def _embed_batch(client: httpx.AsyncClient, inputs: list[str]) -> list[list[float]]:
+    """
+    POST one batch to Ollama's /api/embed, retrying transport errors and 5xx with
+    exponential backoff. Errors caused by the inputs are raised as InputRejected at once.
+    """
+    for attempt in range(settings.embedding_max_retries + 1):
+        try:
             resp = await client.post(
-                f"{settings.ollama_url}/api/embeddings",
-                json={"model": settings.embedding_model, "prompt": prefix + text},
+                "/api/embed",
+                json={"model": settings.embedding_model, "input": inputs, "keep_alive": settings.ollama_keep_alive},
+                timeout=timeout(settings.ollama_embed_timeout),
             )
             resp.raise_for_status()
-            embeddings.append(resp.json()["embedding"])
-    return embeddings
+            embeddings = resp.json()["embeddings"]
+            if len(embeddings) != len(inputs):
+                raise ValueError(f"Expected {len(inputs)} embeddings, got {len(embeddings)}")
+            return embeddings
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            if _rejected_by_input(e):
+                raise InputRejected(str(e)) from e
+            if attempt == settings.embedding_max_retries:
+                raise
+            delay = 2 ** attempt
+            logger.warning(f"Embedding batch of {len(inputs)} failed ({e}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+
+
+async def _gather_or_cancel(*coros):
+    """Like asyncio.gather, but the first failure cancels the others before it is raised."""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def _embed_uncached(inputs: list[str]) -> list[list[float]]:
+    """
+    Embed already-prefixed inputs in batches of `embedding_batch_size`, with at most
+    `embedding_concurrency` batches in flight. Output order matches input order.
+    """
+    batch_size = max(1, settings.embedding_batch_size)
+    semaphore = asyncio.Semaphore(max(1, settings.embedding_concurrency))
+    client = get_client()
+
+    async def run(batch: list[str]) -> list[list[float]]:
+        try:
+            async with semaphore:
+                return await _embed_batch(client, batch)
+        except InputRejected:
+            if len(batch) == 1:
+                raise
+            # Split the rejected batch so one bad input doesn't sink its neighbours
+            mid = len(batch) // 2
+            head, tail = await _gather_or_cancel(run(batch[:mid]), run(batch[mid:]))
+            return head + tail
+
+    results = await _gather_or_cancel(
+        *(run(inputs[i:i + batch_size]) for i in range(0, len(inputs), batch_size))
+    )
+    return [embedding for batch in results for embedding in batch]
+
+
+async def embed_texts(texts: list[str], prefix: str = "search_document: ") -> list[list[float]]:
+    """
+    Embed texts via Ollama. Adds the nomic-embed-text task prefix.
+    Embeddings already in the cache, keyed by (model, prefix, sha256(text)), are
+    reused; only the rest (deduplicated) are sent to the model.
+    """
+    if not texts:
+        return []
+
+    hashes = [embedding_cache.text_hash(text) for text in texts]
+    cached: dict[str, list[float]] = {}
+    if settings.embedding_cache_enabled:
+        try:
+            cached = await embedding_cache.lookup(prefix, hashes)
+        except Exception:
+            logger.warning("Embedding cache lookup failed; embedding without it", exc_info=True)
+
+    missing = {h: text for h, text in zip(hashes, texts) if h not in cached}
+    if missing:
+        computed = dict(zip(missing, await _embed_uncached([prefix + text for text in missing.values()])))
+        if settings.embedding_cache_enabled:
+            try:
+                await embedding_cache.store(prefix, computed)
+            except Exception:
+                logger.warning("Embedding cache store failed", exc_info=True)
+        cached.update(computed)
+
+    return [cached[h] for h in hashes]
 
 
 async def embed_query(text: str) -> list[float]:
@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import time
+from array import array
+from itertools import groupby
+
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.database import async_session
+from app.models.embedding_cache import EmbeddingCacheEntry
+
+logger = logging.getLogger(__name__)
+
+_BATCH = 500
+_EVICT_BATCH = 10_000
+
+_stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+_last_eviction = 0.0
+# (model, prefix, text hash) of hits whose last_used_at hasn't been written yet
+_touched: set[tuple[str, str, str]] = set()
+_last_touch_flush = 0.0
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _pack(embedding: list[float]) -> bytes:
+    return array("f", embedding).tobytes()
+
+
+def _unpack(data: bytes) -> list[float]:
+    values = array("f")
+    values.frombytes(data)
+    return values.tolist()
+
+
+async def lookup(prefix: str, hashes: list[str]) -> dict[str, list[float]]:
+    """Return cached embeddings for the given text hashes, noting them as recently used."""
+    found: dict[str, list[float]] = {}
+    unique = list(dict.fromkeys(hashes))
+    async with async_session() as db:
+        for i in range(0, len(unique), _BATCH):
+            batch = unique[i:i + _BATCH]
+            result = await db.execute(
+                select(EmbeddingCacheEntry.text_sha256, EmbeddingCacheEntry.embedding).where(
+                    EmbeddingCacheEntry.model == settings.embedding_model,
+                    EmbeddingCacheEntry.prefix == prefix,
+                    EmbeddingCacheEntry.text_sha256.in_(batch),
+                )
+            )
+            found.update((row.text_sha256, _unpack(row.embedding)) for row in result)
+
+    _touched.update((settings.embedding_model, prefix, h) for h in found)
+    hit_count = sum(1 for h in hashes if h in found)
+    _stats["hits"] += hit_count
+    _stats["misses"] += len(hashes) - hit_count
+    if time.monotonic() - _last_touch_flush >= settings.embedding_cache_touch_interval:
+        await _flush_touched()
+    return found
+
+
+async def _flush_touched() -> None:
+    """Write the pending last_used_at refreshes, one UPDATE per (model, prefix) batch."""
+    global _last_touch_flush
+    _last_touch_flush = time.monotonic()
+    if not _touched:
+        return
+    pending = sorted(_touched)
+    _touched.clear()
+    async with async_session() as db:
+        for (model, prefix), group in groupby(pending, key=lambda key: key[:2]):
+            hashes = [key[2] for key in group]
+            for i in range(0, len(hashes), _BATCH):
+                await db.execute(
+                    update(EmbeddingCacheEntry)
+                    .where(
+                        EmbeddingCacheEntry.model == model,
+                        EmbeddingCacheEntry.prefix == prefix,
+                        EmbeddingCacheEntry.text_sha256.in_(hashes[i:i + _BATCH]),
+                    )
+                    .values(last_used_at=func.now())
+                )
+        await db.commit()
+
+
+async def store(prefix: str, entries: dict[str, list[float]]) -> None:
+    """Insert embeddings keyed by text hash, then evict least-recently-used rows if due."""
+    rows = [
+        {"model": settings.embedding_model, "prefix": prefix, "text_sha256": h, "embedding": _pack(e)}
+        for h, e in entries.items()
+    ]
+    async with async_session() as db:
+        for i in range(0, len(rows), _BATCH):
+            await db.execute(insert(EmbeddingCacheEntry).values(rows[i:i + _BATCH]).on_conflict_do_nothing())
+        await db.commit()
+    _stats["stored"] += len(rows)
+    await _maybe_evict()
+
+
+async def _maybe_evict() -> None:
+    global _last_eviction
+    now = time.monotonic()
+    if now - _last_eviction < settings.embedding_cache_evict_interval:
+        return
+    _last_eviction = now
+
+    # Apply pending refreshes first so recently used rows aren't evicted
+    await _flush_touched()
+
+    # Rows past the max_entries most recently used ones, by primary key; ties on
+    # last_used_at are broken by key so exactly the excess is removed
+    key = (EmbeddingCacheEntry.model, EmbeddingCacheEntry.prefix, EmbeddingCacheEntry.text_sha256)
+    excess = (
+        select(*key)
+        .order_by(EmbeddingCacheEntry.last_used_at.desc(), *key)
+        .offset(settings.embedding_cache_max_entries)
+        .limit(_EVICT_BATCH)
+    )
+    evicted = 0
+    async with async_session() as db:
+        while True:
+            result = await db.execute(delete(EmbeddingCacheEntry).where(tuple_(*key).in_(excess)))
+            await db.commit()
+            evicted += result.rowcount
+            if result.rowcount < _EVICT_BATCH:
+                break
+    if evicted:
+        _stats["evicted"] += evicted
+        logger.info(f"Evicted {evicted} embedding cache entries")
+
+
+def cache_stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {**_stats, "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None}
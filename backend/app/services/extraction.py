@@ -0,0 +1,83 @@
+import asyncio
+import multiprocessing
+from collections import deque
+from collections.abc import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pymupdf
+
+from app.config import settings
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def count_pages(filepath: str) -> int:
+    with pymupdf.open(filepath) as doc:
+        return doc.page_count
+
+
+def extract_pages(filepath: str, start: int = 0, stop: int | None = None) -> list[dict]:
+    """Extract text from pages [start, stop) of a PDF using PyMuPDF."""
+    pages = []
+    with pymupdf.open(filepath) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for i in range(start, stop):
+            text = doc[i].get_text()
+            if text.strip():
+                pages.append({"page": i + 1, "text": text})
+    return pages
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn keeps the workers free of the parent's event loop and open sockets
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.extraction_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def iter_page_batches(filepath: str) -> AsyncIterator[list[dict]]:
+    """
+    Extract a PDF in the process pool, split into ranges of `extraction_pages_per_task`
+    pages. Ranges run in parallel and are yielded in page order as soon as each
+    one (and everything before it) has finished.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    pending: deque[asyncio.Future] = deque()
+    try:
+        page_count = await loop.run_in_executor(executor, count_pages, filepath)
+        step = max(1, settings.extraction_pages_per_task)
+        ranges = iter(range(0, page_count, step))
+        # Keep every worker busy plus one range queued each, without extracting far ahead
+        window = max(1, settings.extraction_workers) * 2
+
+        def submit_next() -> None:
+            start = next(ranges, None)
+            if start is not None:
+                pending.append(loop.run_in_executor(executor, extract_pages, filepath, start, start + step))
+
+        for _ in range(window):
+            submit_next()
+        while pending:
+            pages = await pending.popleft()
+            submit_next()
+            yield pages
+    except BrokenProcessPool:
+        # A worker died (e.g. on a malformed PDF); start a fresh pool for the next document
+        shutdown_executor()
+        raise
+    finally:
+        for fut in pending:
+            fut.cancel()
@@ -0,0 +1,185 @@
+"""
+Chat generations run detached from the HTTP request that started them. Each one keeps
+its encoded events in a bounded ring buffer, so a client whose connection dropped can
+reattach with Last-Event-ID and carry on from the last event it saw. A generation that
+nobody is following is cancelled after `generation_resume_grace_seconds`. Like the
+conversation events, generations only exist in the API process that started them.
+"""
+import asyncio
+import logging
+import uuid
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from app.config import settings
+from app.services.stream_events import ErrorEvent, StreamEvent
+
+logger = logging.getLogger(__name__)
+
+GENERATION_FAILED_MESSAGE = "The answer could not be generated. Please try again."
+
+
+class ResumeUnavailable(Exception):
+    """The events after the requested resume point have left the ring buffer."""
+
+
+class Generation:
+    def __init__(self, conv_id: str, user_id: str):
+        self.id = uuid.uuid4().hex
+        self.conv_id = conv_id
+        self.user_id = user_id
+        self.done = False
+        self.task: asyncio.Task | None = None
+        self._frames: deque[tuple[int, str]] = deque(maxlen=settings.generation_buffer_events)
+        self._seq = 0
+        self._changed = asyncio.Event()
+        self._followers = 0
+        self._grace: asyncio.TimerHandle | None = None
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.id}:{seq}"
+
+    def emit(self, event: StreamEvent) -> None:
+        """Encode an event once, with its SSE id, and wake the followers."""
+        self._seq += 1
+        self._frames.append((self._seq, event.encode(self.event_id(self._seq))))
+        self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _first_buffered(self) -> int:
+        return self._frames[0][0] if self._frames else self._seq + 1
+
+    def check_resume(self, after: int) -> None:
+        if after < self._first_buffered() - 1:
+            raise ResumeUnavailable(f"Generation {self.id} no longer buffers events after {after}")
+
+    async def follow(self, after: int = 0, heartbeat: float = 15.0) -> AsyncIterator[str | None]:
+        """
+        Yield encoded frames with a sequence number above `after`, then the live tail
+        until the generation ends, or None every `heartbeat` seconds while idle. Ends
+        early if this follower falls so far behind that the buffer overtakes it.
+        """
+        self._attach()
+        try:
+            while True:
+                changed = self._changed
+                while after < self._seq:
+                    first = self._first_buffered()
+                    if after < first - 1:
+                        logger.info(f"Follower of generation {self.id} fell behind the buffer at {after}")
+                        return
+                    after += 1
+                    yield self._frames[after - first][1]
+                if self.done:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._detach()
+
+    def _attach(self) -> None:
+        self._followers += 1
+        if self._grace is not None:
+            self._grace.cancel()
+            self._grace = None
+
+    def _detach(self) -> None:
+        self._followers -= 1
+        if self._followers == 0:
+            self._arm_grace()
+
+    def _arm_grace(self) -> None:
+        if not self.done and self._grace is None:
+            self._grace = asyncio.get_running_loop().call_later(
+                settings.generation_resume_grace_seconds, self._abandon
+            )
+
+    def _abandon(self) -> None:
+        self._grace = None
+        if self._followers == 0 and self.task is not None and not self.task.done():
+            logger.info(f"Cancelling generation {self.id}: no client reattached")
+            self.task.cancel()
+
+    def _finish(self) -> None:
+        self.done = True
+        if self._grace is not None:
+            self._grace.cancel()
+            self._grace = None
+        self._wake()
+
+
+_generations: dict[str, Generation] = {}
+_latest: dict[str, str] = {}  # conversation id -> id of its most recent generation
+
+
+def start(conv_id: str, user_id: str, produce: Callable[[Generation], Awaitable[None]]) -> Generation:
+    """Run `produce(generation)` as a detached task; it reports progress with `generation.emit`."""
+    gen = Generation(conv_id, user_id)
+    _generations[gen.id] = gen
+    _latest[conv_id] = gen.id
+    gen.task = asyncio.create_task(_run(gen, produce))
+    # Covers a client that is gone before its response starts following
+    gen._arm_grace()
+    return gen
+
+
+async def _run(gen: Generation, produce: Callable[[Generation], Awaitable[None]]) -> None:
+    try:
+        await produce(gen)
+    except asyncio.CancelledError:
+        pass
+    except Exception:
+        logger.exception(f"Generation {gen.id} for conversation {gen.conv_id} failed")
+        # Followers must not mistake a failure for a dropped connection and keep resuming
+        gen.emit(ErrorEvent(GENERATION_FAILED_MESSAGE))
+    finally:
+        gen._finish()
+        # Keep the finished buffer around for clients that reconnect after the end
+        asyncio.get_running_loop().call_later(settings.generation_retention_seconds, _forget, gen)
+
+
+def _forget(gen: Generation) -> None:
+    _generations.pop(gen.id, None)
+    if _latest.get(gen.conv_id) == gen.id:
+        del _latest[gen.conv_id]
+
+
+def get(generation_id: str) -> Generation | None:
+    return _generations.get(generation_id)
+
+
+def latest(conv_id: str) -> Generation | None:
+    generation_id = _latest.get(conv_id)
+    return _generations.get(generation_id) if generation_id else None
+
+
+def parse_event_id(event_id: str | None) -> tuple[str | None, int]:
+    """Split a Last-Event-ID of the form `<generation id>:<sequence>`."""
+    if not event_id:
+        return None, 0
+    generation_id, _, seq = event_id.rpartition(":")
+    try:
+        return generation_id or None, int(seq)
+    except ValueError:
+        return None, 0
+
+
+def stats() -> dict:
+    running = [g for g in _generations.values() if not g.done]
+    return {
+        "running": len(running),
+        "retained": len(_generations) - len(running),
+        "followers": sum(g._followers for g in running),
+    }
+
+
+async def shutdown() -> None:
+    tasks = [g.task for g in _generations.values() if g.task is not None and not g.task.done()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,197 @@
+"""
+Conversation history for the prompt. The most recent turns are sent verbatim up to
+`history_token_budget`; older turns are folded into a rolling summary stored on the
+Conversation, maintained by low-priority background work after each answer. Turns
+that have left the window but are not summarized yet are sent trimmed.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+import httpx
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.services.llm_scheduler import get_scheduler
+from app.services.ollama import get_client, timeout
+from app.services.rag import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a legal research conversation. Update the summary with the new "
+    "exchanges. Keep the facts, names, dates, documents and open questions the user may refer back to. "
+    "Reply with ONLY the updated summary, in under 200 words."
+)
+SUMMARY_MESSAGE_CHARS = 1500
+# Per-message cap for turns shown in the prompt while they wait to be summarized
+UNSUMMARIZED_MESSAGE_CHARS = 300
+
+_tasks: set[asyncio.Task] = set()
+_summarizing: set[str] = set()
+
+
+@dataclass
+class History:
+    summary: str | None
+    messages: list[dict]  # oldest first
+    window_start: datetime | None  # created_at of the oldest message in `messages`
+    overflow: bool  # older messages exist outside the window
+    unsummarized: str | None = None  # trimmed turns that left the window but aren't in the summary yet
+
+    @property
+    def earlier_context(self) -> str | None:
+        """Everything before the window: the summary, then any turns it doesn't cover yet."""
+        if not self.unsummarized:
+            return self.summary
+        if not self.summary:
+            return f"Earlier exchanges:\n{self.unsummarized}"
+        return f"{self.summary}\n\nLater exchanges, not yet summarized:\n{self.unsummarized}"
+
+
+async def load_history(db: AsyncSession, conv: Conversation) -> History:
+    """
+    Newest messages that fit the token budget (at least one, truncated if needed), oldest
+    first. Older messages the summary doesn't cover yet are kept, trimmed, in `unsummarized`
+    so nothing drops out of the prompt while a summary is pending.
+    """
+    query = select(Message.role, Message.content, Message.created_at).where(Message.conversation_id == conv.id)
+    if conv.summarized_until is not None:
+        query = query.where(Message.created_at > conv.summarized_until)
+    result = await db.execute(query.order_by(Message.created_at.desc()).limit(settings.history_max_messages))
+    rows = result.all()
+
+    window = []
+    remaining = settings.history_token_budget
+    for row in rows:
+        content = row.content
+        cost = estimate_tokens(content)
+        if cost > remaining:
+            if window:
+                break
+            content = content[-int(remaining * settings.context_chars_per_token):]
+            cost = remaining
+        window.append({"role": row.role, "content": content, "created_at": row.created_at})
+        remaining -= cost
+    window.reverse()
+    pending = rows[len(window):][::-1]
+
+    return History(
+        summary=conv.summary,
+        messages=[{"role": m["role"], "content": m["content"]} for m in window],
+        window_start=window[0]["created_at"] if window else None,
+        overflow=len(window) < len(rows) or len(rows) == settings.history_max_messages,
+        unsummarized=_format_exchanges(pending, UNSUMMARIZED_MESSAGE_CHARS) if pending else None,
+    )
+
+
+def _format_exchanges(rows, max_chars: int = SUMMARY_MESSAGE_CHARS) -> str:
+    lines = []
+    for row in rows:
+        content = row.content
+        if len(content) > max_chars:
+            content = content[:max_chars] + " …"
+        lines.append(f"{'User' if row.role == 'user' else 'Assistant'}: {content}")
+    return "\n\n".join(lines)
+
+
+async def _summarize_batch(summary: str | None, rows) -> str | None:
+    ticket = get_scheduler().enqueue_background()
+    try:
+        async for _ in ticket.wait():
+            pass
+        resp = await get_client().post(
+            "/api/chat",
+            json={
+                "model": settings.chat_model,
+                "messages": [
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {
+                        "role": "user",
+                        "content": f"Current summary:\n{summary or '(none)'}\n\nNew exchanges:\n{_format_exchanges(rows)}",
+                    },
+                ],
+                "stream": False,
+                "keep_alive": settings.ollama_keep_alive,
+            },
+            timeout=timeout(settings.ollama_summary_timeout),
+        )
+        resp.raise_for_status()
+        text = resp.json()["message"]["content"].strip()
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        logger.warning(f"Failed to update conversation summary: {e}")
+        return None
+    finally:
+        ticket.release()
+    return text[:settings.history_summary_max_chars] or None
+
+
+async def _summarize(conv_id: str, window_start: datetime) -> None:
+    """Fold unsummarized messages older than `window_start` into the summary, a batch at a time."""
+    from app.database import async_session
+
+    while True:
+        async with async_session() as db:
+            conv = await db.get(Conversation, conv_id)
+            if conv is None:
+                return
+            summary, summarized_until = conv.summary, conv.summarized_until
+            pending = select(Message.role, Message.content, Message.created_at).where(
+                Message.conversation_id == conv_id, Message.created_at < window_start
+            )
+            if summarized_until is not None:
+                pending = pending.where(Message.created_at > summarized_until)
+            count = await db.scalar(select(func.count()).select_from(pending.subquery()))
+            if count < settings.history_summary_min_messages:
+                return
+            rows = (await db.execute(pending.order_by(Message.created_at.asc()).limit(settings.history_max_messages))).all()
+
+        # No connection is held while the model works
+        new_summary = await _summarize_batch(summary, rows)
+        if new_summary is None:
+            return
+
+        async with async_session() as db:
+            # Only advance from the state this batch was built on
+            condition = (
+                Conversation.summarized_until.is_(None)
+                if summarized_until is None
+                else Conversation.summarized_until == summarized_until
+            )
+            result = await db.execute(
+                update(Conversation)
+                .where(Conversation.id == conv_id, condition)
+                .values(summary=new_summary, summarized_until=rows[-1].created_at)
+            )
+            await db.commit()
+            if result.rowcount == 0:
+                return
+
+
+async def _run_summary(conv_id: str, window_start: datetime) -> None:
+    try:
+        await _summarize(conv_id, window_start)
+    except Exception as e:
+        logger.warning(f"Failed to summarize conversation {conv_id}: {e}")
+    finally:
+        _summarizing.discard(conv_id)
+
+
+def schedule_summary(conv_id: str, history: History) -> None:
+    """After an answer, summarize turns that have fallen out of the window, if enough have."""
+    if not history.overflow or history.window_start is None or conv_id in _summarizing:
+        return
+    _summarizing.add(conv_id)
+    task = asyncio.create_task(_run_summary(conv_id, history.window_start))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def shutdown() -> None:
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
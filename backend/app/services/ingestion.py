@@ -1,30 +1,95 @@
+import asyncio
 import logging
 
-import pymupdf
+from sqlalchemy import update
 
+from app.config import settings
 from app.database import async_session
 from app.models.document import Document
-from app.services.chunking import chunk_pages
+from app.services.chunking import Chunk, ChunkStream
 from app.services.embedding import embed_texts
-from app.services.vector_store import upsert_chunks
+from app.services.extraction import iter_page_batches
+from app.services.retrieval_cache import bump_corpus_version
+from app.services.vector_store import delete_document_vectors, upsert_chunks
 
 logger = logging.getLogger(__name__)
 
 
-def extract_pages(filepath: str) -> list[dict]:
-    """Extract text from each page of a PDF using PyMuPDF."""
-    pages = []
-    doc = pymupdf.open(filepath)
-    for i, page in enumerate(doc):
-        text = page.get_text()
-        if text.strip():
-            pages.append({"page": i + 1, "text": text})
-    doc.close()
-    return pages
+async def _update_progress(doc_id: str, **values) -> None:
+    async with async_session() as db:
+        await db.execute(update(Document).where(Document.id == doc_id).values(**values))
+        await db.commit()
+
+
+async def _extract_and_chunk(doc: Document, out: asyncio.Queue) -> None:
+    """Stage 1: extract pages in the process pool and chunk them as they arrive."""
+    stream = ChunkStream()
+    pages = 0
+    chunks = 0
+    async for batch in iter_page_batches(doc.filepath):
+        for page in batch:
+            for chunk in stream.feed(page):
+                await out.put(chunk)
+                chunks += 1
+        pages += len(batch)
+        await _update_progress(doc.id, pages_extracted=pages)
+    for chunk in stream.finish():
+        await out.put(chunk)
+        chunks += 1
+    await out.put(None)
+    await _update_progress(doc.id, page_count=pages, chunks_total=chunks)
+
+
+async def _embed(chunks_in: asyncio.Queue, out: asyncio.Queue) -> None:
+    """Stage 2: embed chunks in groups large enough to keep every embedding slot busy."""
+    group_size = max(1, settings.embedding_batch_size * settings.embedding_concurrency)
+    group: list[Chunk] = []
+    done = False
+    while not done:
+        chunk = await chunks_in.get()
+        if chunk is None:
+            done = True
+        else:
+            group.append(chunk)
+        if group and (done or len(group) >= group_size):
+            embeddings = await embed_texts([c.text for c in group])
+            for item in zip(group, embeddings):
+                await out.put(item)
+            group = []
+    await out.put(None)
+
+
+async def _store(doc: Document, embedded_in: asyncio.Queue) -> int:
+    """Stage 3: upsert embedded chunks into Qdrant in fixed-size batches."""
+    batch: list[tuple[Chunk, list[float]]] = []
+    stored = 0
+    done = False
+    while not done:
+        item = await embedded_in.get()
+        if item is None:
+            done = True
+        else:
+            batch.append(item)
+        if batch and (done or len(batch) >= settings.qdrant_upsert_batch_size):
+            await upsert_chunks(
+                case_id=doc.case_id,
+                document_id=doc.id,
+                document_name=doc.filename,
+                chunks=[{"text": c.text, "page_numbers": c.page_numbers, "chunk_index": c.chunk_index} for c, _ in batch],
+                embeddings=[e for _, e in batch],
+            )
+            stored += len(batch)
+            batch = []
+            await _update_progress(doc.id, chunks_embedded=stored)
+    return stored
 
 
 async def ingest_document(doc_id: str):
-    """Run the full ingestion pipeline for a document."""
+    """
+    Run the ingestion pipeline for a document: extraction/chunking, embedding and
+    Qdrant upserts run concurrently, connected by bounded queues. Failures are
+    recorded on the document and re-raised so the job queue can record them too.
+    """
     async with async_session() as db:
         doc = await db.get(Document, doc_id)
         if not doc:
@@ -33,44 +98,45 @@ async def ingest_document(doc_id: str):
 
         try:
             doc.status = "processing"
+            doc.pages_extracted = 0
+            doc.chunks_embedded = 0
+            doc.chunks_total = None
             await db.commit()
 
-            # Extract text
-            pages = extract_pages(doc.filepath)
-            doc.page_count = len(pages)
-
-            if not pages:
-                doc.status = "completed"
-                await db.commit()
-                return
-
-            # Chunk
-            chunks = chunk_pages(pages)
-            if not chunks:
-                doc.status = "completed"
-                await db.commit()
-                return
-
-            # Embed
-            chunk_texts = [c.text for c in chunks]
-            embeddings = await embed_texts(chunk_texts)
-
-            # Store in Qdrant
-            chunk_dicts = [{"text": c.text, "page_numbers": c.page_numbers, "chunk_index": c.chunk_index} for c in chunks]
-            upsert_chunks(
-                case_id=doc.case_id,
-                document_id=doc.id,
-                document_name=doc.filename,
-                chunks=chunk_dicts,
-                embeddings=embeddings,
-            )
+            # A retried job may have left vectors from an interrupted attempt
+            await delete_document_vectors(doc.id)
 
+            chunks = asyncio.Queue(maxsize=settings.ingestion_queue_size)
+            embedded = asyncio.Queue(maxsize=settings.ingestion_queue_size)
+            stages = [
+                asyncio.create_task(_extract_and_chunk(doc, chunks)),
+                asyncio.create_task(_embed(chunks, embedded)),
+                asyncio.create_task(_store(doc, embedded)),
+            ]
+            try:
+                _, _, stored = await asyncio.gather(*stages)
+            except BaseException:
+                for stage in stages:
+                    stage.cancel()
+                await asyncio.gather(*stages, return_exceptions=True)
+                raise
+
+            await db.refresh(doc)
             doc.status = "completed"
+            await bump_corpus_version(db, doc.case_id)
             await db.commit()
-            logger.info(f"Ingested document {doc.filename}: {len(chunks)} chunks")
+            logger.info(f"Ingested document {doc.filename}: {stored} chunks")
 
         except Exception as e:
             logger.exception(f"Ingestion failed for {doc_id}")
             doc.status = "failed"
             doc.error_message = str(e)[:500]
             await db.commit()
+            try:
+                await delete_document_vectors(doc.id)
+            except Exception:
+                logger.warning(f"Could not remove partial vectors for {doc_id}", exc_info=True)
+            # Searches may have seen the partial vectors while ingestion ran
+            await bump_corpus_version(db, doc.case_id)
+            await db.commit()
+            raise
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, exists, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session
+from app.models.document import Document
+from app.models.ingestion_job import IngestionJob
+
+logger = logging.getLogger(__name__)
+
+_pool: "IngestionWorkerPool | None" = None
+
+
+def _lease_deadline() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=settings.ingestion_lease_seconds)
+
+
+def enqueue_ingestion(db: AsyncSession, document_id: str) -> IngestionJob:
+    """Add an ingestion job to the session. It becomes visible to workers on commit."""
+    job = IngestionJob(document_id=document_id)
+    db.add(job)
+    return job
+
+
+def notify_workers() -> None:
+    """Wake the in-process worker pool, if any, instead of waiting for its next poll."""
+    if _pool is not None:
+        _pool.notify()
+
+
+async def claim_job(worker_id: str) -> IngestionJob | None:
+    """Lease the oldest queued job, or a running job whose lease has expired."""
+    now = datetime.now(timezone.utc)
+    async with async_session() as db:
+        result = await db.execute(
+            select(IngestionJob)
+            .where(
+                or_(
+                    IngestionJob.status == "queued",
+                    and_(
+                        IngestionJob.status == "running",
+                        IngestionJob.lease_expires_at < now,
+                        IngestionJob.attempts < settings.ingestion_max_attempts,
+                    ),
+                )
+            )
+            .order_by(IngestionJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = result.scalar_one_or_none()
+        if job is None:
+            return None
+        job.status = "running"
+        job.attempts += 1
+        job.worker_id = worker_id
+        job.lease_expires_at = _lease_deadline()
+        await db.commit()
+        return job
+
+
+async def renew_lease(job_id: str, worker_id: str) -> bool:
+    """Extend a job's lease. Returns False if another worker has taken it over."""
+    async with async_session() as db:
+        result = await db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, IngestionJob.worker_id == worker_id, IngestionJob.status == "running")
+            .values(lease_expires_at=_lease_deadline())
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+
+async def finish_job(job_id: str, worker_id: str, error: str | None = None) -> None:
+    async with async_session() as db:
+        await db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, IngestionJob.worker_id == worker_id)
+            .values(
+                status="failed" if error else "completed",
+                last_error=error[:500] if error else None,
+                lease_expires_at=None,
+            )
+        )
+        await db.commit()
+
+
+async def release_job(job_id: str, worker_id: str) -> None:
+    """Hand a job back to the queue on graceful shutdown without counting the attempt."""
+    async with async_session() as db:
+        await db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, IngestionJob.worker_id == worker_id, IngestionJob.status == "running")
+            .values(status="queued", attempts=IngestionJob.attempts - 1, worker_id=None, lease_expires_at=None)
+        )
+        await db.commit()
+
+
+async def recover_orphaned_jobs() -> None:
+    """
+    Requeue jobs whose worker died, fail the ones that keep dying, and enqueue
+    documents left pending/processing without any live job.
+    """
+    now = datetime.now(timezone.utc)
+    async with async_session() as db:
+        expired = and_(IngestionJob.status == "running", IngestionJob.lease_expires_at < now)
+
+        exhausted = await db.execute(
+            update(IngestionJob)
+            .where(expired, IngestionJob.attempts >= settings.ingestion_max_attempts)
+            .values(status="failed", last_error="Worker died too many times", lease_expires_at=None)
+            .returning(IngestionJob.document_id)
+        )
+        failed_doc_ids = exhausted.scalars().all()
+        if failed_doc_ids:
+            await db.execute(
+                update(Document)
+                .where(Document.id.in_(failed_doc_ids))
+                .values(status="failed", error_message="Ingestion worker crashed repeatedly")
+            )
+
+        requeued = await db.execute(
+            update(IngestionJob)
+            .where(expired)
+            .values(status="queued", worker_id=None, lease_expires_at=None)
+        )
+
+        live_job = exists().where(
+            IngestionJob.document_id == Document.id,
+            IngestionJob.status.in_(("queued", "running")),
+        )
+        stranded = await db.execute(
+            select(Document.id)
+            .where(Document.status.in_(("pending", "processing")), ~live_job)
+            .with_for_update(skip_locked=True)
+        )
+        stranded_ids = stranded.scalars().all()
+        for doc_id in stranded_ids:
+            enqueue_ingestion(db, doc_id)
+
+        await db.commit()
+
+    if failed_doc_ids or requeued.rowcount or stranded_ids:
+        logger.info(
+            f"Recovered ingestion jobs: {requeued.rowcount} requeued, "
+            f"{len(failed_doc_ids)} failed, {len(stranded_ids)} stranded documents enqueued"
+        )
+
+
+class IngestionWorkerPool:
+    """A fixed number of workers pulling ingestion jobs from the ingestion_jobs table."""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = max(1, concurrency)
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def start(self) -> None:
+        global _pool
+        await recover_orphaned_jobs()
+        self._tasks = [asyncio.create_task(self._run(f"{self._worker_prefix}:{i}")) for i in range(self.concurrency)]
+        _pool = self
+
+    async def stop(self) -> None:
+        global _pool
+        if _pool is self:
+            _pool = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def _run(self, worker_id: str) -> None:
+        while True:
+            try:
+                job = await claim_job(worker_id)
+            except Exception:
+                logger.exception("Failed to claim ingestion job")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.ingestion_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            await self._process(job, worker_id)
+
+    async def _process(self, job: IngestionJob, worker_id: str) -> None:
+        from app.services.ingestion import ingest_document
+
+        work = asyncio.create_task(ingest_document(job.document_id))
+        lost_lease = False
+
+        async def heartbeat() -> None:
+            nonlocal lost_lease
+            while True:
+                await asyncio.sleep(settings.ingestion_heartbeat_seconds)
+                if not await renew_lease(job.id, worker_id):
+                    logger.warning(f"Lost lease on ingestion job {job.id}; abandoning it")
+                    lost_lease = True
+                    work.cancel()
+                    return
+
+        beat = asyncio.create_task(heartbeat())
+        error = None
+        try:
+            await work
+        except asyncio.CancelledError:
+            if lost_lease:
+                return  # the worker that took over the lease finishes the job
+            # The pool itself is being stopped: put the job back for the next worker
+            work.cancel()
+            await asyncio.shield(release_job(job.id, worker_id))
+            raise
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+        finally:
+            beat.cancel()
+
+        await finish_job(job.id, worker_id, error)
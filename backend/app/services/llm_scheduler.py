@@ -0,0 +1,170 @@
+"""
+Admission control for chat generation. Ollama only runs a few streams at once
+efficiently, so at most `llm_max_concurrency` generations hold a slot and the rest
+wait in per-user queues served round-robin, so one user's burst can't starve others.
+Background work (e.g. conversation titles) waits in a separate queue that is only
+served when no interactive request is waiting.
+
+The scheduler is per process; with several API workers each enforces its own limit.
+"""
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+
+from app.config import settings
+
+
+class SchedulerOverloaded(Exception):
+    """Raised by `enqueue` when the wait queue (overall or for the user) is full."""
+
+
+class Ticket:
+    def __init__(self, scheduler: "LLMScheduler", user_id: str | None):
+        self.user_id = user_id  # None for background tickets
+        self.granted = False
+        self.released = False
+        self.enqueued_at = time.monotonic()
+        self._scheduler = scheduler
+        self._changed = asyncio.Event()
+
+    def position(self) -> int:
+        """1-based place in line; 0 once the ticket holds a slot."""
+        return self._scheduler.position(self)
+
+    async def wait(self) -> AsyncIterator[int]:
+        """Yield the queue position each time it changes, until a slot is granted."""
+        while not self.granted:
+            self._changed.clear()
+            yield self.position()
+            await self._changed.wait()
+
+    def release(self) -> None:
+        """Give up the slot or queue place. Safe to call more than once."""
+        self._scheduler.release(self)
+
+
+class LLMScheduler:
+    def __init__(self, concurrency: int, max_queue: int, max_queue_per_user: int):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        # Insertion order is the round-robin order; a user moves to the back when served
+        self._queues: dict[str, deque[Ticket]] = {}
+        self._background: deque[Ticket] = deque()
+        # A user granted a slot without queueing never went to the back, so they are
+        # passed over once if someone else is waiting
+        self._last_served: str | None = None
+        self._active = 0
+        self._stats = {"granted_total": 0, "queued_total": 0, "rejected_total": 0, "wait_seconds_total": 0.0}
+
+    def enqueue(self, user_id: str) -> Ticket:
+        ticket = Ticket(self, user_id)
+        if self._active < self.concurrency and not self._queues:
+            self._grant(ticket)
+            return ticket
+        queued = sum(len(q) for q in self._queues.values())
+        if queued >= self.max_queue or len(self._queues.get(user_id, ())) >= self.max_queue_per_user:
+            self._stats["rejected_total"] += 1
+            raise SchedulerOverloaded()
+        self._queues.setdefault(user_id, deque()).append(ticket)
+        self._stats["queued_total"] += 1
+        return ticket
+
+    def enqueue_background(self) -> Ticket:
+        """Queue low-priority work behind all interactive requests. Never rejected."""
+        ticket = Ticket(self, None)
+        if self._active < self.concurrency and not self._queues and not self._background:
+            self._grant(ticket)
+        else:
+            self._background.append(ticket)
+            self._stats["queued_total"] += 1
+        return ticket
+
+    def _grant(self, ticket: Ticket) -> None:
+        if ticket.user_id is not None:
+            self._last_served = ticket.user_id
+        ticket.granted = True
+        ticket._changed.set()
+        self._active += 1
+        self._stats["granted_total"] += 1
+        self._stats["wait_seconds_total"] += time.monotonic() - ticket.enqueued_at
+
+    def _rotation(self) -> list[str]:
+        """Waiting users in the order they will be served."""
+        users = list(self._queues)
+        if len(users) > 1 and users[0] == self._last_served:
+            users.append(users.pop(0))
+        return users
+
+    def _dispatch(self) -> None:
+        while self._active < self.concurrency and self._queues:
+            user_id = self._rotation()[0]
+            queue = self._queues.pop(user_id)
+            self._grant(queue.popleft())
+            if queue:
+                self._queues[user_id] = queue
+        while self._active < self.concurrency and self._background:
+            self._grant(self._background.popleft())
+        # Positions shift for everyone still waiting
+        for queue in [*self._queues.values(), self._background]:
+            for ticket in queue:
+                ticket._changed.set()
+
+    def release(self, ticket: Ticket) -> None:
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.granted:
+            self._active -= 1
+        elif ticket.user_id is None:
+            if ticket in self._background:
+                self._background.remove(ticket)
+        else:
+            queue = self._queues.get(ticket.user_id)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[ticket.user_id]
+        self._dispatch()
+
+    def position(self, ticket: Ticket) -> int:
+        if ticket.granted:
+            return 0
+        if ticket.user_id is None:
+            return sum(len(q) for q in self._queues.values()) + self._background.index(ticket) + 1
+        index = self._queues[ticket.user_id].index(ticket)
+        # Round-robin serves every user's i-th ticket before anyone's (i+1)-th; users
+        # ahead in the rotation also go first within round `index`
+        ahead = 0
+        before = True
+        for user_id in self._rotation():
+            queue = self._queues[user_id]
+            if user_id == ticket.user_id:
+                before = False
+                ahead += index
+            else:
+                ahead += min(len(queue), index + 1 if before else index)
+        return ahead + 1
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": self._active,
+            "queued": sum(len(q) for q in self._queues.values()),
+            "queued_users": len(self._queues),
+            "queued_background": len(self._background),
+            **self._stats,
+        }
+
+
+_scheduler: LLMScheduler | None = None
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler(
+            settings.llm_max_concurrency, settings.llm_max_queue, settings.llm_max_queue_per_user
+        )
+    return _scheduler
@@ -0,0 +1,240 @@
+"""
+Embedded vector index for single-node installs that don't run Qdrant.
+
+Each case gets a directory of immutable segments: `seg-<ns>-<id>.npy` holds
+L2-normalised float16 embeddings (memory-mapped on read) and the matching
+`.json` holds their payloads. Deleting a document writes a tombstone
+(document_id -> ns) to `tombstones.json`, which masks the document's rows in
+every segment written at or before that time. Compaction rewrites a case's
+segments into one without the masked rows.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+
+
+def _root() -> Path:
+    if settings.numpy_index_dir:
+        return Path(settings.numpy_index_dir)
+    return Path(settings.upload_dir).resolve().parent / "vectors"
+
+
+def _segment_ns(path: Path) -> int:
+    return int(path.stem.split("-")[1])
+
+
+def _write_segment(case_dir: Path, ns: int, vectors: np.ndarray, payloads: list[dict]) -> None:
+    """Write a segment atomically: payloads first, then the matrix that makes it visible."""
+    stem = f"seg-{ns}-{uuid.uuid4().hex[:8]}"
+    tmp_json = case_dir / f"{stem}.json.tmp"
+    tmp_npy = case_dir / f"{stem}.npy.tmp"
+    tmp_json.write_text(json.dumps(payloads))
+    with open(tmp_npy, "wb") as f:
+        np.save(f, vectors.astype(np.float16))
+    os.replace(tmp_json, case_dir / f"{stem}.json")
+    os.replace(tmp_npy, case_dir / f"{stem}.npy")
+
+
+class _Segment:
+    def __init__(self, path: Path):
+        self.path = path
+        self.ns = _segment_ns(path)
+        self.vectors = np.load(path, mmap_mode="r")
+        self.payloads: list[dict] = json.loads(path.with_suffix(".json").read_text())
+        self.document_ids = np.array([p["document_id"] for p in self.payloads])
+
+
+class NumpyVectorIndex:
+    def __init__(self, root: Path):
+        self.root = root
+        self._segments: dict[Path, _Segment] = {}
+        self._tombstones: dict[str, int] = {}
+        self._tombstones_mtime = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """
+        Coordinate across threads and processes (API and standalone worker): writers
+        take it exclusively, readers shared so compaction can't unlink a segment
+        while they open it. Not reentrant.
+        """
+        with open(self.root / ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def init(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _case_dir(self, case_id: str) -> Path:
+        return self.root / case_id
+
+    def _load_tombstones(self) -> dict[str, int]:
+        path = self.root / "tombstones.json"
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            return {}
+        if mtime != self._tombstones_mtime:
+            self._tombstones = json.loads(path.read_text())
+            self._tombstones_mtime = mtime
+        return self._tombstones
+
+    def _save_tombstones(self, tombstones: dict[str, int]) -> None:
+        path = self.root / "tombstones.json"
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(tombstones))
+        os.replace(tmp, path)
+
+    def _load_segments(self, case_id: str) -> list[_Segment]:
+        case_dir = self._case_dir(case_id)
+        if not case_dir.is_dir():
+            return []
+        paths = sorted(case_dir.glob("seg-*.npy"))
+        with self._lock:
+            segments = []
+            for path in paths:
+                if path not in self._segments:
+                    self._segments[path] = _Segment(path)
+                segments.append(self._segments[path])
+            # Forget segments removed by compaction
+            live = set(paths)
+            for path in [p for p in self._segments if p.parent == case_dir and p not in live]:
+                del self._segments[path]
+        return segments
+
+    def _live_mask(self, segment: _Segment, tombstones: dict[str, int]) -> np.ndarray | None:
+        dead = [doc_id for doc_id, ns in tombstones.items() if ns >= segment.ns]
+        if not dead:
+            return None
+        return ~np.isin(segment.document_ids, dead)
+
+    def upsert(self, case_id: str, document_id: str, document_name: str, chunks: list[dict], embeddings: list[list[float]]) -> None:
+        if not chunks:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        payloads = [
+            {
+                "document_id": document_id,
+                "document_name": document_name,
+                "chunk_index": chunk["chunk_index"],
+                "page_numbers": chunk["page_numbers"],
+                "text": chunk["text"],
+            }
+            for chunk in chunks
+        ]
+        case_dir = self._case_dir(case_id)
+        with self._file_lock():
+            case_dir.mkdir(parents=True, exist_ok=True)
+            _write_segment(case_dir, time.time_ns(), vectors, payloads)
+            too_many = len(list(case_dir.glob("seg-*.npy"))) > settings.numpy_index_max_segments
+        if too_many:
+            self.compact(case_id)
+
+    def search(self, case_id: str, query_embedding: list[float], top_k: int) -> list[dict]:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+        # Opened segments stay readable (memory-mapped, payloads loaded) after compaction
+        # unlinks their files, so the lock is only needed while opening them
+        with self._file_lock(shared=True):
+            tombstones = self._load_tombstones()
+            segments = self._load_segments(case_id)
+
+        candidates: list[tuple[float, _Segment, int]] = []
+        for segment in segments:
+            scores = segment.vectors @ query
+            mask = self._live_mask(segment, tombstones)
+            if mask is not None:
+                scores = np.where(mask, scores, -np.inf)
+            k = min(top_k, len(scores))
+            if k == 0:
+                continue
+            best = np.argpartition(-scores, k - 1)[:k]
+            candidates.extend((float(scores[i]), segment, int(i)) for i in best if np.isfinite(scores[i]))
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        return [{"score": score, **segment.payloads[i]} for score, segment, i in candidates[:top_k]]
+
+    def delete_document(self, document_id: str) -> None:
+        with self._file_lock():
+            tombstones = dict(self._load_tombstones())
+            tombstones[document_id] = time.time_ns()
+            self._save_tombstones(tombstones)
+
+    def compact(self, case_id: str) -> int:
+        """Merge a case's segments into one, dropping deleted rows. Returns rows removed."""
+        with self._file_lock():
+            segments = self._load_segments(case_id)
+            if not segments:
+                return 0
+            tombstones = self._load_tombstones()
+            vectors, payloads = [], []
+            removed = 0
+            for segment in segments:
+                mask = self._live_mask(segment, tombstones)
+                if mask is None:
+                    mask = np.ones(len(segment.payloads), dtype=bool)
+                removed += int((~mask).sum())
+                vectors.append(np.asarray(segment.vectors)[mask])
+                payloads.extend(p for p, keep in zip(segment.payloads, mask) if keep)
+            if len(segments) == 1 and not removed:
+                return 0
+            if payloads:
+                # Keep the newest source timestamp so later tombstones still apply to these rows
+                _write_segment(self._case_dir(case_id), max(s.ns for s in segments), np.concatenate(vectors), payloads)
+            for segment in segments:
+                segment.path.unlink()
+                segment.path.with_suffix(".json").unlink()
+            self._load_segments(case_id)
+            return removed
+
+    def compact_all(self) -> int:
+        """Compact every case, then drop tombstones that no longer mask anything."""
+        started = time.time_ns()
+        removed = sum(self.compact(d.name) for d in self.root.iterdir() if d.is_dir())
+        with self._file_lock():
+            tombstones = {doc_id: ns for doc_id, ns in self._load_tombstones().items() if ns >= started}
+            self._save_tombstones(tombstones)
+        return removed
+
+
+_index: NumpyVectorIndex | None = None
+
+
+def get_index() -> NumpyVectorIndex:
+    global _index
+    if _index is None:
+        _index = NumpyVectorIndex(_root())
+        _index.init()
+    return _index
+
+
+async def upsert_chunks(case_id: str, document_id: str, document_name: str, chunks: list[dict], embeddings: list[list[float]]) -> None:
+    await asyncio.to_thread(get_index().upsert, case_id, document_id, document_name, chunks, embeddings)
+
+
+async def search_chunks(case_id: str, query_embedding: list[float], top_k: int) -> list[dict]:
+    return await asyncio.to_thread(get_index().search, case_id, query_embedding, top_k)
+
+
+async def delete_document_vectors(document_id: str) -> None:
+    await asyncio.to_thread(get_index().delete_document, document_id)
+
+
+async def compact() -> int:
+    return await asyncio.to_thread(get_index().compact_all)
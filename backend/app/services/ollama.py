@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import time
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_client: httpx.AsyncClient | None = None
+_transport: "_InstrumentedTransport | None" = None
+_keep_warm_task: asyncio.Task | None = None
+
+# Last measured chat first-token latency, refreshed by warm-ups and the background probe
+_latency = {"first_token_ms": None, "measured_at": 0.0}
+_probe_lock = asyncio.Lock()
+_granted_at_last_probe = 0  # scheduler grants seen by the last probe, to skip idle periods
+
+_stats = {
+    "requests_total": 0,
+    "in_flight": 0,
+    "peak_in_flight": 0,
+}
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body wrapper that marks the request finished when the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream):
+        self._stream = stream
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            _stats["in_flight"] -= 1
+        await self._stream.aclose()
+
+
+class _InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """Pooled transport that counts in-flight requests and exposes pool occupancy."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        _stats["requests_total"] += 1
+        _stats["in_flight"] += 1
+        _stats["peak_in_flight"] = max(_stats["peak_in_flight"], _stats["in_flight"])
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            _stats["in_flight"] -= 1
+            raise
+        response.stream = _TrackedStream(response.stream)
+        return response
+
+    def connection_counts(self) -> dict:
+        connections = self._pool.connections
+        idle = sum(1 for c in connections if c.is_idle())
+        return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+
+
+def _http2_supported() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def timeout(seconds: float) -> httpx.Timeout:
+    """Per-call-site timeout with the shared connect timeout."""
+    return httpx.Timeout(seconds, connect=settings.ollama_connect_timeout)
+
+
+async def init_client() -> None:
+    """Create the process-wide pooled client used for all Ollama traffic."""
+    global _client, _transport
+    if _client is not None:
+        return
+    limits = httpx.Limits(
+        max_connections=settings.ollama_max_connections,
+        max_keepalive_connections=settings.ollama_max_keepalive_connections,
+        keepalive_expiry=settings.ollama_keepalive_expiry,
+    )
+    http2 = settings.ollama_http2 and _http2_supported()
+    _transport = _InstrumentedTransport(limits=limits, http2=http2)
+    _client = httpx.AsyncClient(
+        base_url=settings.ollama_url,
+        timeout=timeout(settings.ollama_chat_timeout),
+        transport=_transport,
+    )
+
+
+async def close_client() -> None:
+    global _client, _transport
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _transport = None
+
+
+def get_client() -> httpx.AsyncClient:
+    if _client is None:
+        raise RuntimeError("Ollama client is not initialised; call init_client() first")
+    return _client
+
+
+def pool_stats() -> dict:
+    """Snapshot of request and connection counts for sizing the pool."""
+    stats = dict(_stats)
+    stats["max_connections"] = settings.ollama_max_connections
+    stats["max_keepalive_connections"] = settings.ollama_max_keepalive_connections
+    if _transport is not None:
+        stats.update(_transport.connection_counts())
+    return stats
+
+
+def _model_tag(name: str) -> str:
+    return name if ":" in name else f"{name}:latest"
+
+
+async def _load_embedding_model() -> None:
+    resp = await get_client().post(
+        "/api/embed",
+        json={"model": settings.embedding_model, "input": "warm-up", "keep_alive": settings.ollama_keep_alive},
+        timeout=timeout(settings.ollama_embed_timeout),
+    )
+    resp.raise_for_status()
+
+
+async def measure_first_token(timeout_seconds: float | None = None) -> float:
+    """Load the chat model if needed and time its first generated token, in ms. One probe at a time."""
+    async with _probe_lock:
+        started = time.perf_counter()
+        async with get_client().stream(
+            "POST",
+            "/api/generate",
+            json={
+                "model": settings.chat_model,
+                "prompt": "ok",
+                "stream": True,
+                "options": {"num_predict": 1},
+                "keep_alive": settings.ollama_keep_alive,
+            },
+            timeout=timeout(timeout_seconds or settings.ollama_chat_timeout),
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if line:
+                    break
+        elapsed = (time.perf_counter() - started) * 1000
+        _latency.update(first_token_ms=round(elapsed, 1), measured_at=time.monotonic())
+        return elapsed
+
+
+async def warm_up(chat: bool = True, embedding: bool = True) -> None:
+    """Pre-load models so the first real request doesn't pay the load time. Never raises."""
+    if embedding:
+        try:
+            await _load_embedding_model()
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to warm up embedding model {settings.embedding_model}: {e}")
+    if chat:
+        try:
+            ms = await measure_first_token()
+            logger.info(f"Chat model {settings.chat_model} warm, first token in {ms:.0f}ms")
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to warm up chat model {settings.chat_model}: {e}")
+
+
+async def _refresh_latency() -> None:
+    """
+    Re-measure first-token latency as low-priority LLM work, if the chat model is loaded
+    and has been used since the last probe. Like any call, a probe restarts Ollama's
+    keep-alive timer, so probing while idle would keep the model loaded indefinitely.
+    """
+    global _granted_at_last_probe
+    from app.services.llm_scheduler import get_scheduler
+
+    if get_scheduler().stats()["granted_total"] == _granted_at_last_probe:
+        return
+    try:
+        if _model_tag(settings.chat_model) not in await _loaded_models():
+            return  # probing a cold model would block on the load
+    except (httpx.HTTPError, KeyError, ValueError):
+        return
+    ticket = get_scheduler().enqueue_background()
+    try:
+        async for _ in ticket.wait():
+            pass
+        await measure_first_token(settings.ollama_probe_timeout)
+    except httpx.HTTPError as e:
+        logger.warning(f"First-token probe failed: {e}")
+    finally:
+        ticket.release()
+        # Includes this probe's own slot, so only later requests count as activity
+        _granted_at_last_probe = get_scheduler().stats()["granted_total"]
+
+
+async def _keep_warm_loop(warm_up_first: bool, chat: bool, embedding: bool) -> None:
+    if warm_up_first:
+        await warm_up(chat, embedding)
+    warm_interval = settings.ollama_keep_warm_interval
+    probe_interval = settings.ollama_ready_probe_interval if chat else 0
+    now = time.monotonic()
+    next_warm = now + warm_interval if warm_interval > 0 else None
+    next_probe = now + probe_interval if probe_interval > 0 else None
+    while next_warm is not None or next_probe is not None:
+        due = min(t for t in (next_warm, next_probe) if t is not None)
+        await asyncio.sleep(max(0.0, due - time.monotonic()))
+        now = time.monotonic()
+        if next_warm is not None and now >= next_warm:
+            await warm_up(chat, embedding)
+            next_warm = time.monotonic() + warm_interval
+        elif next_probe is not None and now >= next_probe:
+            await _refresh_latency()
+            next_probe = time.monotonic() + probe_interval
+
+
+def start_keep_warm(chat: bool = True, embedding: bool = True, warm_up_first: bool = True) -> None:
+    """
+    Optionally warm up in the background (startup isn't blocked on model loads;
+    /api/ready reports progress), then re-ping every `ollama_keep_warm_interval` seconds
+    and refresh the first-token latency every `ollama_ready_probe_interval` seconds, where set.
+    """
+    global _keep_warm_task
+    if _keep_warm_task is None:
+        _keep_warm_task = asyncio.create_task(_keep_warm_loop(warm_up_first, chat, embedding))
+
+
+async def stop_keep_warm() -> None:
+    global _keep_warm_task
+    if _keep_warm_task is not None:
+        _keep_warm_task.cancel()
+        try:
+            await _keep_warm_task
+        except asyncio.CancelledError:
+            pass
+        _keep_warm_task = None
+
+
+async def _loaded_models() -> set[str]:
+    resp = await get_client().get("/api/ps", timeout=timeout(settings.ollama_connect_timeout))
+    resp.raise_for_status()
+    return {_model_tag(m["name"]) for m in resp.json().get("models", [])}
+
+
+async def readiness() -> dict:
+    """
+    Whether Ollama is reachable with both models loaded, plus the last measured
+    first-token latency. Only reads /api/ps; the latency is refreshed in the background.
+    """
+    try:
+        loaded = await _loaded_models()
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        return {"ready": False, "ollama": "unreachable", "error": str(e)}
+
+    models = {
+        "chat": _model_tag(settings.chat_model) in loaded,
+        "embedding": _model_tag(settings.embedding_model) in loaded,
+    }
+    measured_at = _latency["measured_at"]
+    return {
+        "ready": all(models.values()),
+        "ollama": "ok",
+        "models_loaded": models,
+        "first_token_ms": _latency["first_token_ms"],
+        "first_token_age_s": round(time.monotonic() - measured_at, 1) if measured_at else None,
+    }
@@ -1,11 +1,17 @@
+import asyncio
 import json
+import math
 import re
+import time
 from collections.abc import AsyncIterator
 
-import httpx
-
 from app.config import settings
+from app.services import answer_cache, retrieval_cache
 from app.services.embedding import embed_query
+from app.services.llm_scheduler import Ticket
+from app.services.ollama import get_client, timeout
+from app.services.stream_events import CitationEvent, DoneEvent, QueuedEvent, StreamEvent, TokenEvent
+from app.services.timing import StageTimings
 from app.services.vector_store import search_chunks
 
 SYSTEM_PROMPT_TEMPLATE = """You are CAISE, an AI legal research assistant. Answer the user's question based ONLY on the provided source documents. Follow these rules strictly:
@@ -20,6 +26,66 @@ SOURCES:
 
 Remember: cite every factual claim with [Source N]. Do not fabricate information."""
 
+PROMPT_HASH = answer_cache.prompt_hash(SYSTEM_PROMPT_TEMPLATE)
+
+_stats = {"completed_total": 0, "cancelled_total": 0, "tokens_total": 0, "wasted_tokens_total": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / settings.context_chars_per_token)
+
+
+def _join_overlapping(head: str, tail: str) -> str:
+    """Join consecutive chunks, dropping the text `tail` repeats from the end of `head`."""
+    for k in range(min(len(head), len(tail), settings.chunk_overlap), 0, -1):
+        if head.endswith(tail[:k]):
+            return head + tail[k:]
+    return head + "\n" + tail
+
+
+def build_context(chunks: list[dict]) -> list[dict]:
+    """
+    Turn retrieved chunks into prompt sources. Consecutive chunks of the same document
+    are merged into one source without their shared overlap, sources are ordered by
+    best score, and the lowest-scoring ones are dropped (or the last one truncated)
+    to stay within `context_token_budget`. The returned list defines [Source N].
+    """
+    by_position = sorted(chunks, key=lambda c: (c["document_id"], c["chunk_index"]))
+    groups: list[dict] = []
+    for chunk in by_position:
+        last = groups[-1] if groups else None
+        if last and last["document_id"] == chunk["document_id"] and last["chunk_indexes"][-1] + 1 == chunk["chunk_index"]:
+            last["text"] = _join_overlapping(last["text"], chunk["text"])
+            last["page_numbers"] = sorted(set(last["page_numbers"]) | set(chunk["page_numbers"]))
+            last["chunk_indexes"].append(chunk["chunk_index"])
+            last["score"] = max(last["score"], chunk["score"])
+        else:
+            groups.append({
+                "document_id": chunk["document_id"],
+                "document_name": chunk["document_name"],
+                "page_numbers": list(chunk["page_numbers"]),
+                "chunk_indexes": [chunk["chunk_index"]],
+                "text": chunk["text"],
+                "score": chunk["score"],
+            })
+    groups.sort(key=lambda g: g["score"], reverse=True)
+
+    sources: list[dict] = []
+    remaining = settings.context_token_budget
+    for group in groups:
+        header_tokens = estimate_tokens(f"[Source {len(sources) + 1}] (Document: {group['document_name']}, Pages: )") + 4
+        text_tokens = estimate_tokens(group["text"])
+        if header_tokens + text_tokens <= remaining:
+            sources.append(group)
+            remaining -= header_tokens + text_tokens
+            continue
+        room = remaining - header_tokens
+        if room >= settings.context_min_source_tokens:
+            cut = int(room * settings.context_chars_per_token)
+            sources.append({**group, "text": group["text"][:cut].rstrip() + " …"})
+        break
+    return sources
+
 
 def build_sources_text(chunks: list[dict]) -> str:
     parts = []
@@ -29,62 +95,199 @@ def build_sources_text(chunks: list[dict]) -> str:
     return "\n\n".join(parts)
 
 
+SOURCE_REF = re.compile(r"\[Source (\d+)\]")
+SOURCE_REF_PREFIX = "[Source "
+
+
+class CitationTracker:
+    """
+    Resolves [Source N] references as tokens arrive. Each token is scanned once,
+    together with any unfinished marker left at the end of the previous one, so a
+    marker split across tokens is still found.
+    """
+
+    def __init__(self, chunks: list[dict]):
+        self.chunks = chunks
+        self._found: dict[int, dict] = {}
+        self._tail = ""
+
+    def feed(self, token: str) -> list[dict]:
+        """Citations referenced for the first time in this token."""
+        text = self._tail + token
+        new = []
+        end = 0
+        for match in SOURCE_REF.finditer(text):
+            end = match.end()
+            ref = int(match.group(1))
+            if ref not in self._found and 1 <= ref <= len(self.chunks):
+                chunk = self.chunks[ref - 1]
+                self._found[ref] = {
+                    "source_index": ref,
+                    "document_name": chunk["document_name"],
+                    "page_numbers": chunk["page_numbers"],
+                    "snippet": chunk["text"][:300],
+                }
+                new.append(self._found[ref])
+        self._tail = _unfinished_ref(text, end)
+        return new
+
+    @property
+    def citations(self) -> list[dict]:
+        return [self._found[ref] for ref in sorted(self._found)]
+
+
+def _unfinished_ref(text: str, start: int) -> str:
+    """The end of `text` if it could be the beginning of a [Source N] marker, else ''."""
+    bracket = text.rfind("[", start)
+    if bracket == -1:
+        return ""
+    tail = text[bracket:]
+    if SOURCE_REF_PREFIX.startswith(tail) or (
+        tail.startswith(SOURCE_REF_PREFIX) and tail[len(SOURCE_REF_PREFIX):].isdigit()
+    ):
+        return tail
+    return ""
+
+
 def extract_citations(content: str, chunks: list[dict]) -> list[dict]:
-    """Parse [Source N] references from the completed response."""
-    refs = set(int(m) for m in re.findall(r'\[Source (\d+)\]', content))
-    citations = []
-    for ref in sorted(refs):
-        if 1 <= ref <= len(chunks):
-            chunk = chunks[ref - 1]
-            citations.append({
-                "source_index": ref,
-                "document_name": chunk["document_name"],
-                "page_numbers": chunk["page_numbers"],
-                "snippet": chunk["text"][:300],
-            })
-    return citations
+    """Parse [Source N] references from a complete response."""
+    tracker = CitationTracker(chunks)
+    tracker.feed(content)
+    return tracker.citations
+
+
+async def _search(case_id: str, question: str, top_k: int, timings: StageTimings) -> list[dict]:
+    with timings.stage("embed"):
+        query_embedding = await embed_query(question)
+    with timings.stage("search"):
+        return await search_chunks(case_id, query_embedding, top_k=top_k, query_text=question)
+
+
+async def retrieve_chunks(
+    case_id: str, question: str, top_k: int | None = None, timings: StageTimings | None = None
+) -> list[dict]:
+    """Embed the question and search the case, reusing results while the case's corpus is unchanged."""
+    top_k = top_k or settings.top_k
+    timings = timings or StageTimings()
+    if not settings.retrieval_cache_enabled:
+        return await _search(case_id, question, top_k, timings)
+
+    version = await retrieval_cache.get_corpus_version(case_id)
+    key = retrieval_cache.cache_key(case_id, question, top_k)
+    chunks = retrieval_cache.get(key, version)
+    if chunks is None:
+        chunks = await _search(case_id, question, top_k, timings)
+        retrieval_cache.put(key, version, chunks)
+    return chunks
+
+
+async def lookup_answer(case_id: str, question: str) -> tuple[answer_cache.AnswerKey, answer_cache.CachedAnswer | None]:
+    """Key for caching this question's answer, and the cached answer if there is one."""
+    version = await retrieval_cache.get_corpus_version(case_id)
+    key = answer_cache.answer_key(case_id, version, question, PROMPT_HASH)
+    return key, answer_cache.get(key)
+
+
+async def replay_answer(
+    answer: answer_cache.CachedAnswer, timings: StageTimings | None = None
+) -> AsyncIterator[StreamEvent]:
+    """Send a cached answer through the normal event protocol, all at once."""
+    yield TokenEvent(answer.content)
+    for citation in answer.citations:
+        yield CitationEvent(**citation)
+    yield DoneEvent(answer.content, answer.citations, cached=True, timings=timings.as_dict() if timings else {})
 
 
 async def stream_rag_response(
     case_id: str,
     question: str,
     history: list[dict],
-) -> AsyncIterator[str]:
+    ticket: Ticket | None = None,
+    answer_key: answer_cache.AnswerKey | None = None,
+    history_summary: str | None = None,
+    chunks: list[dict] | None = None,
+    timings: StageTimings | None = None,
+) -> AsyncIterator[StreamEvent]:
     """
     Full RAG pipeline:
     1. Embed query
-    2. Retrieve chunks
-    3. Stream LLM response
-    4. Yield SSE events
+    2. Retrieve chunks (skipped if the caller already retrieved `chunks`)
+    3. Wait for an LLM slot (if a scheduler ticket is given), emitting `queued` events
+    4. Stream LLM response, with a `citation` event the first time each source is cited
+    5. Yield typed stream events (encode with `StreamEvent.encode`)
+
+    `history` is the already-windowed recent conversation, and `history_summary`
+    covers the turns before it (see `History.earlier_context`). The ticket is released when the stream ends,
+    however it ends. With an `answer_key`, a completed answer is stored in the
+    answer cache, unless history or a summary went into the prompt. Stage durations from `timings` are reported in the done event.
     """
-    # 1. Embed the question
-    query_embedding = await embed_query(question)
+    try:
+        async for event in _stream_rag_response(
+            case_id,
+            question,
+            history,
+            ticket=ticket,
+            answer_key=answer_key,
+            history_summary=history_summary,
+            chunks=chunks,
+            timings=timings or StageTimings(),
+        ):
+            yield event
+    finally:
+        if ticket is not None:
+            ticket.release()
 
-    # 2. Retrieve relevant chunks
-    chunks = search_chunks(case_id, query_embedding)
+
+async def _stream_rag_response(
+    case_id: str,
+    question: str,
+    history: list[dict],
+    *,
+    ticket: Ticket | None,
+    answer_key: answer_cache.AnswerKey | None,
+    history_summary: str | None,
+    chunks: list[dict] | None,
+    timings: StageTimings,
+) -> AsyncIterator[StreamEvent]:
+    # 1-2. Embed the question and retrieve relevant chunks
+    if chunks is None:
+        with timings.stage("retrieval"):
+            chunks = await retrieve_chunks(case_id, question, timings=timings)
 
     if not chunks:
-        yield f"data: {json.dumps({'type': 'token', 'content': 'No relevant documents found for this case. Please upload documents first.'})}\n\n"
-        yield f"data: {json.dumps({'type': 'done', 'citations': []})}\n\n"
+        notice = "No relevant documents found for this case. Please upload documents first."
+        yield TokenEvent(notice)
+        yield DoneEvent(notice, timings=timings.as_dict())
         return
 
-    # 3. Build prompt
+    # 3. Build prompt from merged, budgeted sources; [Source N] indexes into this list
+    chunks = build_context(chunks)
     sources_text = build_sources_text(chunks)
     system_prompt = SYSTEM_PROMPT_TEMPLATE.format(sources=sources_text)
 
     messages = [{"role": "system", "content": system_prompt}]
-    # Include recent history for context (last 10 messages)
-    for msg in history[-10:]:
+    if history_summary:
+        messages.append({"role": "system", "content": f"Earlier in this conversation:\n{history_summary}"})
+    for msg in history:
         messages.append({"role": msg["role"], "content": msg["content"]})
     messages.append({"role": "user", "content": question})
 
-    # 4. Stream from Ollama
-    full_response = ""
-    async with httpx.AsyncClient(timeout=300) as client:
-        async with client.stream(
+    # 4. Wait for a generation slot, then stream from Ollama
+    if ticket is not None:
+        with timings.stage("queue"):
+            async for position in ticket.wait():
+                yield QueuedEvent(position)
+
+    parts: list[str] = []
+    tracker = CitationTracker(chunks)
+    token_count = 0
+    generation_started = time.perf_counter()
+    try:
+        async with get_client().stream(
             "POST",
-            f"{settings.ollama_url}/api/chat",
-            json={"model": settings.chat_model, "messages": messages, "stream": True},
+            "/api/chat",
+            json={"model": settings.chat_model, "messages": messages, "stream": True, "keep_alive": settings.ollama_keep_alive},
+            timeout=timeout(settings.ollama_chat_timeout),
         ) as resp:
             resp.raise_for_status()
             async for line in resp.aiter_lines():
@@ -93,9 +296,30 @@ async def stream_rag_response(
                 data = json.loads(line)
                 if "message" in data and "content" in data["message"]:
                     token = data["message"]["content"]
-                    full_response += token
-                    yield f"data: {json.dumps({'type': 'token', 'content': token})}\n\n"
+                    if token_count == 0:
+                        timings.record("first_token", generation_started)
+                    token_count += 1
+                    parts.append(token)
+                    yield TokenEvent(token)
+                    for citation in tracker.feed(token):
+                        yield CitationEvent(**citation)
+    except (asyncio.CancelledError, GeneratorExit):
+        # The consumer went away; leaving the `async with` closed the upstream stream
+        _stats["cancelled_total"] += 1
+        _stats["wasted_tokens_total"] += token_count
+        raise
+    timings.record("generation", generation_started)
+    _stats["completed_total"] += 1
+    _stats["tokens_total"] += token_count
+
+    # 5. Send the final event with every citation found along the way
+    full_response = "".join(parts)
+    citations = tracker.citations
+    # The key only covers the question, so an answer that saw the conversation is not reusable
+    if answer_key is not None and not history and not history_summary:
+        answer_cache.put(answer_key, full_response, citations)
+    yield DoneEvent(full_response, citations, timings=timings.as_dict())
+
 
-    # 5. Extract citations and send final event
-    citations = extract_citations(full_response, chunks)
-    yield f"data: {json.dumps({'type': 'done', 'content': full_response, 'citations': citations})}\n\n"
+def generation_stats() -> dict:
+    return dict(_stats)
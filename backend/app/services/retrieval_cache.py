@@ -0,0 +1,74 @@
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session
+from app.models.case import Case
+
+CacheKey = tuple[str, str, int]  # (case_id, normalized question, top_k)
+
+_entries: OrderedDict[CacheKey, tuple[int, float, list[dict]]] = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "stale": 0, "evicted": 0}
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+def cache_key(case_id: str, question: str, top_k: int) -> CacheKey:
+    return (case_id, normalize_question(question), top_k)
+
+
+async def get_corpus_version(case_id: str) -> int:
+    async with async_session() as db:
+        return await db.scalar(select(Case.corpus_version).where(Case.id == case_id)) or 0
+
+
+async def bump_corpus_version(db: AsyncSession, case_id: str) -> None:
+    """Mark the case's searchable corpus as changed. Takes effect when `db` commits."""
+    from app.services import answer_cache
+
+    await db.execute(update(Case).where(Case.id == case_id).values(corpus_version=Case.corpus_version + 1))
+    invalidate_case(case_id)
+    answer_cache.invalidate_case(case_id)
+
+
+def get(key: CacheKey, corpus_version: int) -> list[dict] | None:
+    entry = _entries.get(key)
+    if entry is None:
+        _stats["misses"] += 1
+        return None
+    version, stored_at, chunks = entry
+    if version != corpus_version or time.monotonic() - stored_at > settings.retrieval_cache_ttl_seconds:
+        del _entries[key]
+        _stats["stale"] += 1
+        _stats["misses"] += 1
+        return None
+    _entries.move_to_end(key)
+    _stats["hits"] += 1
+    return chunks
+
+
+def put(key: CacheKey, corpus_version: int, chunks: list[dict]) -> None:
+    _entries[key] = (corpus_version, time.monotonic(), chunks)
+    _entries.move_to_end(key)
+    while len(_entries) > settings.retrieval_cache_max_entries:
+        _entries.popitem(last=False)
+        _stats["evicted"] += 1
+
+
+def invalidate_case(case_id: str) -> None:
+    for key in [k for k in _entries if k[0] == case_id]:
+        del _entries[key]
+
+
+def cache_stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "entries": len(_entries),
+        "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None,
+    }
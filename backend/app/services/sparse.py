@@ -0,0 +1,47 @@
+import re
+import zlib
+from collections import Counter
+
+from app.config import settings
+
+# Keeps citations and docket numbers ("42-u.s.c", "1:23-cv-04567", "12.3") as single tokens
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.:/][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased terms; compound tokens are also emitted as their parts."""
+    tokens = []
+    for match in TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        parts = re.split(r"[-.:/]", token)
+        if len(parts) > 1:
+            tokens.append(token)
+        tokens.extend(p for p in parts if p not in STOPWORDS)
+    return tokens
+
+
+def _index(token: str) -> int:
+    return zlib.crc32(token.encode())
+
+
+def document_vector(text: str) -> tuple[list[int], list[float]]:
+    """
+    BM25 term-frequency weights for a chunk, as (indices, values). The IDF half of
+    BM25 is applied by Qdrant at query time (IDF modifier on the sparse vector).
+    """
+    counts = Counter(_index(t) for t in tokenize(text))
+    doc_len = sum(counts.values())
+    k1, b = settings.bm25_k1, settings.bm25_b
+    norm = k1 * (1 - b + b * doc_len / settings.bm25_avg_doc_tokens)
+    indices = list(counts)
+    values = [tf * (k1 + 1) / (tf + norm) for tf in counts.values()]
+    return indices, values
+
+
+def query_vector(text: str) -> tuple[list[int], list[float]]:
+    indices = list(dict.fromkeys(_index(t) for t in tokenize(text)))
+    return indices, [1.0] * len(indices)
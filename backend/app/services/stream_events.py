@@ -0,0 +1,186 @@
+"""
+Typed events for the chat stream. The RAG pipeline yields these objects; the router
+inspects them directly and encodes each one to an SSE frame exactly once.
+"""
+import asyncio
+import json
+import time
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from typing import ClassVar, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class StreamEvent:
+    type: ClassVar[str]
+
+    def encode(self, event_id: str | None = None) -> str:
+        frame = f"data: {json.dumps({'type': self.type, **asdict(self)})}\n\n"
+        return frame if event_id is None else f"id: {event_id}\n{frame}"
+
+
+@dataclass
+class QueuedEvent(StreamEvent):
+    type: ClassVar[str] = "queued"
+    position: int
+
+
+@dataclass
+class TokenEvent(StreamEvent):
+    type: ClassVar[str] = "token"
+    content: str
+
+
+@dataclass
+class CitationEvent(StreamEvent):
+    """A source referenced for the first time in the answer so far."""
+    type: ClassVar[str] = "citation"
+    source_index: int
+    document_name: str
+    page_numbers: list[int]
+    snippet: str
+
+
+@dataclass
+class DoneEvent(StreamEvent):
+    type: ClassVar[str] = "done"
+    content: str
+    citations: list[dict] = field(default_factory=list)
+    cached: bool = False
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class ErrorEvent(StreamEvent):
+    """The answer failed; no done event follows."""
+    type: ClassVar[str] = "error"
+    message: str
+
+
+@dataclass
+class FlushPolicy:
+    """
+    Send buffered tokens once the oldest has waited `interval_ms` or `max_bytes` are
+    buffered, whichever comes first. A 0 disables that trigger; 0/0 sends every token.
+    """
+    interval_ms: int
+    max_bytes: int
+
+    @property
+    def passthrough(self) -> bool:
+        return self.interval_ms <= 0 and self.max_bytes <= 0
+
+
+_END = object()
+
+
+async def coalesce_tokens(events: AsyncGenerator[StreamEvent, None], policy: FlushPolicy) -> AsyncIterator[StreamEvent]:
+    """
+    Merge consecutive token events into fewer, larger ones. A pump task reads the
+    source so buffered text is flushed on time even while the model is between tokens.
+    Any other event flushes the buffer and is passed through unchanged.
+    """
+    if policy.passthrough:
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+        return
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+            await queue.put(_END)
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.create_task(pump())
+    buffer: list[str] = []
+    buffered_bytes = 0
+    deadline = None
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+
+            if isinstance(item, TokenEvent):
+                buffer.append(item.content)
+                buffered_bytes += len(item.content.encode())
+                if deadline is None and policy.interval_ms > 0:
+                    deadline = time.monotonic() + policy.interval_ms / 1000
+                full = policy.max_bytes > 0 and buffered_bytes >= policy.max_bytes
+                due = deadline is not None and time.monotonic() >= deadline
+                if not (full or due):
+                    continue
+            # Flush on size or time, and before any other event or the end of the stream
+            if buffer:
+                yield TokenEvent("".join(buffer))
+                buffer.clear()
+                buffered_bytes = 0
+                deadline = None
+
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            if item is not None and not isinstance(item, TokenEvent):
+                yield item
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await events.aclose()
+
+
+class ClientDisconnected(Exception):
+    """Raised by `until_disconnected` once the client has gone away."""
+
+
+async def until_disconnected(
+    events: AsyncGenerator[T, None],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    poll_interval: float,
+) -> AsyncIterator[T]:
+    """
+    Pass events through while the client is connected. On disconnect, whatever the
+    source is awaiting is cancelled at once, rather than at the next failed write,
+    and ClientDisconnected is raised.
+    """
+    async def watch():
+        while not await is_disconnected():
+            await asyncio.sleep(poll_interval)
+
+    watcher = asyncio.create_task(watch())
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(events.__anext__())
+            await asyncio.wait({pending, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not pending.done():
+                raise ClientDisconnected()
+            try:
+                event = pending.result()
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        watcher.cancel()
+        if pending is not None and not pending.done():
+            # Cancelling the step closes the source generator (and its upstream stream)
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await events.aclose()
@@ -0,0 +1,31 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimings:
+    """Wall-clock durations of named request stages, in ms. Stages may overlap."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._stages: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def record(self, name: str, since: float) -> None:
+        """Record the time from `since` (a perf_counter value) until now under `name`."""
+        self._stages[name] = self._stages.get(name, 0.0) + (time.perf_counter() - since) * 1000
+
+    def as_dict(self) -> dict[str, float]:
+        stages = {name: round(ms, 1) for name, ms in self._stages.items()}
+        stages["total"] = round((time.perf_counter() - self.started) * 1000, 1)
+        return stages
+
+    def server_timing(self) -> str:
+        """Value for a Server-Timing header covering the stages recorded so far."""
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self._stages.items())
@@ -0,0 +1,104 @@
+"""
+Conversation titles. A heuristic title is set as soon as the first message is
+saved; the LLM title is generated afterwards as low-priority background work and
+pushed to subscribers of the conversation's event stream.
+"""
+import asyncio
+import logging
+import re
+
+import httpx
+
+from app.config import settings
+from app.services import conversation_events
+from app.services.llm_scheduler import get_scheduler
+from app.services.ollama import get_client, timeout
+
+logger = logging.getLogger(__name__)
+
+TITLE_MAX_CHARS = 80
+HEURISTIC_MAX_CHARS = 50
+
+_tasks: set[asyncio.Task] = set()
+
+
+def heuristic_title(user_message: str) -> str:
+    """First sentence of the message, cut at a word boundary."""
+    text = " ".join(user_message.split())
+    text = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    if not text:
+        return "New Conversation"
+    if len(text) <= HEURISTIC_MAX_CHARS:
+        return text
+    cut = text[:HEURISTIC_MAX_CHARS].rsplit(" ", 1)[0] or text[:HEURISTIC_MAX_CHARS]
+    return cut.rstrip(",;:") + "..."
+
+
+async def generate_title(user_message: str) -> str | None:
+    """Use the LLM to generate a short title, waiting behind interactive chats. None on failure."""
+    ticket = get_scheduler().enqueue_background()
+    try:
+        async for _ in ticket.wait():
+            pass
+        resp = await get_client().post(
+            "/api/chat",
+            json={
+                "model": settings.chat_model,
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": "Generate a short title (3-6 words) for a conversation that starts with the following message. Reply with ONLY the title, no quotes or punctuation.",
+                    },
+                    {"role": "user", "content": user_message},
+                ],
+                "stream": False,
+                "keep_alive": settings.ollama_keep_alive,
+            },
+            timeout=timeout(settings.ollama_title_timeout),
+        )
+        resp.raise_for_status()
+        title = resp.json()["message"]["content"].strip().strip('"').strip("'")
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        logger.warning(f"Failed to generate title: {e}")
+        return None
+    finally:
+        ticket.release()
+    if not title:
+        return None
+    if len(title) > TITLE_MAX_CHARS:
+        title = title[:TITLE_MAX_CHARS - 3] + "..."
+    return title
+
+
+async def _retitle(conv_id: str, user_message: str, provisional: str) -> None:
+    from app.database import async_session
+    from app.models.conversation import Conversation
+
+    title = await generate_title(user_message)
+    if title is None:
+        return
+    try:
+        async with async_session() as db:
+            conv = await db.get(Conversation, conv_id)
+            # Leave it alone if the conversation is gone or was renamed meanwhile
+            if conv is None or conv.title != provisional:
+                return
+            conv.title = title
+            await db.commit()
+    except Exception as e:
+        logger.warning(f"Failed to save title for conversation {conv_id}: {e}")
+        return
+    conversation_events.publish(conv_id, {"type": "title", "title": title})
+
+
+def schedule_title(conv_id: str, user_message: str, provisional: str) -> None:
+    """Replace the heuristic title with an LLM title in the background."""
+    task = asyncio.create_task(_retitle(conv_id, user_message, provisional))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def shutdown() -> None:
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
@@ -1,27 +1,157 @@
+import logging
 import uuid
 
-from qdrant_client import QdrantClient, models
+from qdrant_client import AsyncQdrantClient, models
 
 from app.config import settings
+from app.services import numpy_index, sparse
 
-client = QdrantClient(url=settings.qdrant_url)
+logger = logging.getLogger(__name__)
+
+_client: AsyncQdrantClient | None = None
+# Whether the collection has the BM25 sparse vector; collections created before it don't
+_has_sparse = False
 
 VECTOR_SIZE = 768  # nomic-embed-text dimension
+SPARSE_VECTOR = "bm25"
+
+
+def _use_numpy() -> bool:
+    return settings.vector_backend == "numpy"
+
+
+async def init_client() -> None:
+    """Create the shared Qdrant client. Called from lifespan, not at import time."""
+    global _client
+    if _client is None and not _use_numpy():
+        _client = AsyncQdrantClient(
+            url=settings.qdrant_url,
+            prefer_grpc=settings.qdrant_prefer_grpc,
+            grpc_port=settings.qdrant_grpc_port,
+            timeout=settings.qdrant_timeout,
+        )
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def get_client() -> AsyncQdrantClient:
+    if _client is None:
+        raise RuntimeError("Qdrant client is not initialised; call init_client() first")
+    return _client
+
+
+def _hnsw_config() -> models.HnswConfigDiff:
+    # payload_m builds per-case HNSW links, so case-filtered search stays fast as other cases grow
+    return models.HnswConfigDiff(
+        m=settings.qdrant_hnsw_m,
+        ef_construct=settings.qdrant_hnsw_ef_construct,
+        payload_m=settings.qdrant_hnsw_payload_m,
+    )
+
+
+def _quantization_config() -> models.QuantizationConfig | None:
+    if settings.qdrant_quantization == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=settings.qdrant_quantization_always_ram,
+            )
+        )
+    if settings.qdrant_quantization == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=settings.qdrant_quantization_always_ram)
+        )
+    return None
+
+
+PAYLOAD_INDEXES = {
+    "case_id": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True),
+    "document_id": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD),
+}
 
 
 async def init_collection():
-    collections = client.get_collections().collections
-    names = [c.name for c in collections]
-    if settings.qdrant_collection not in names:
-        client.create_collection(
-            collection_name=settings.qdrant_collection,
+    """Create the chunk collection, or bring an existing one in line with Settings."""
+    global _has_sparse
+    if _use_numpy():
+        numpy_index.get_index()
+        return
+    client = get_client()
+    name = settings.qdrant_collection
+    if not await client.collection_exists(name):
+        quantization = _quantization_config()
+        await client.create_collection(
+            collection_name=name,
             vectors_config=models.VectorParams(
-                size=VECTOR_SIZE, distance=models.Distance.COSINE
+                size=VECTOR_SIZE,
+                distance=models.Distance.COSINE,
+                # With quantization only the quantized vectors need RAM; originals are for rescoring
+                on_disk=settings.qdrant_on_disk_vectors or quantization is not None,
             ),
+            sparse_vectors_config={SPARSE_VECTOR: models.SparseVectorParams(modifier=models.Modifier.IDF)},
+            hnsw_config=_hnsw_config(),
+            quantization_config=quantization,
         )
+    else:
+        await _update_collection_config(client, name)
 
+    info = await client.get_collection(name)
+    _has_sparse = SPARSE_VECTOR in (info.config.params.sparse_vectors or {})
+    if not _has_sparse and settings.retrieval_mode == "hybrid":
+        logger.warning(
+            f"Collection {name} has no '{SPARSE_VECTOR}' sparse vector; hybrid retrieval is disabled "
+            "until the collection is recreated and documents are re-ingested"
+        )
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field not in (info.payload_schema or {}):
+            await client.create_payload_index(
+                collection_name=name, field_name=field, field_schema=schema, wait=True
+            )
+
+
+async def _update_collection_config(client: AsyncQdrantClient, name: str) -> None:
+    info = await client.get_collection(name)
+    hnsw = info.config.hnsw_config
+    wanted = _hnsw_config()
+    hnsw_changed = (hnsw.m, hnsw.ef_construct, hnsw.payload_m) != (wanted.m, wanted.ef_construct, wanted.payload_m)
+    quantized = info.config.quantization_config is not None
+    wanted_on_disk = settings.qdrant_on_disk_vectors or quantized
+    on_disk_changed = bool(getattr(info.config.params.vectors, "on_disk", False)) != wanted_on_disk
+    if hnsw_changed or on_disk_changed:
+        await client.update_collection(
+            collection_name=name,
+            hnsw_config=wanted if hnsw_changed else None,
+            vectors_config={"": models.VectorParamsDiff(on_disk=wanted_on_disk)} if on_disk_changed else None,
+        )
+    if quantized != (settings.qdrant_quantization != "none"):
+        logger.warning(
+            f"Collection {name} quantization does not match QDRANT_QUANTIZATION={settings.qdrant_quantization}; "
+            "run `python -m app.vector_admin quantize` to apply it"
+        )
+
+
+async def apply_quantization() -> None:
+    """
+    Apply the configured quantization to the existing collection, in place. Qdrant
+    builds the quantized vectors from the stored originals, so nothing is re-embedded.
+    """
+    if _use_numpy():
+        raise RuntimeError("Quantization only applies to the Qdrant vector backend")
+    quantization = _quantization_config()
+    await get_client().update_collection(
+        collection_name=settings.qdrant_collection,
+        vectors_config={"": models.VectorParamsDiff(on_disk=settings.qdrant_on_disk_vectors or quantization is not None)},
+        quantization_config=quantization or models.Disabled.DISABLED,
+    )
 
-def upsert_chunks(
+
+async def upsert_chunks(
     case_id: str,
     document_id: str,
     document_name: str,
@@ -29,12 +159,18 @@ def upsert_chunks(
     embeddings: list[list[float]],
 ):
     """Store chunk embeddings in Qdrant with metadata."""
+    if _use_numpy():
+        return await numpy_index.upsert_chunks(case_id, document_id, document_name, chunks, embeddings)
     points = []
     for chunk, embedding in zip(chunks, embeddings):
+        vector: list[float] | dict = embedding
+        if _has_sparse:
+            indices, values = sparse.document_vector(chunk["text"])
+            vector = {"": embedding, SPARSE_VECTOR: models.SparseVector(indices=indices, values=values)}
         points.append(
             models.PointStruct(
                 id=str(uuid.uuid4()),
-                vector=embedding,
+                vector=vector,
                 payload={
                     "case_id": case_id,
                     "document_id": document_id,
@@ -45,20 +181,62 @@ def upsert_chunks(
                 },
             )
         )
-    client.upsert(collection_name=settings.qdrant_collection, points=points)
+    await get_client().upsert(collection_name=settings.qdrant_collection, points=points)
 
 
-def search_chunks(case_id: str, query_embedding: list[float], top_k: int | None = None) -> list[dict]:
-    """Search for relevant chunks filtered by case_id."""
-    results = client.query_points(
-        collection_name=settings.qdrant_collection,
-        query=query_embedding,
-        query_filter=models.Filter(
-            must=[models.FieldCondition(key="case_id", match=models.MatchValue(value=case_id))]
-        ),
-        limit=top_k or settings.top_k,
-        with_payload=True,
+async def search_chunks(
+    case_id: str,
+    query_embedding: list[float],
+    top_k: int | None = None,
+    query_text: str | None = None,
+    oversampling: float | None = None,
+    rescore: bool | None = None,
+) -> list[dict]:
+    """
+    Search for relevant chunks filtered by case_id. With `query_text` and hybrid
+    retrieval enabled, dense and BM25 sparse candidates are fused with RRF.
+    On a quantized collection, `oversampling` fetches extra candidates from the
+    quantized index and `rescore` re-ranks them with the original vectors.
+    """
+    limit = top_k or settings.top_k
+    if _use_numpy():
+        return await numpy_index.search_chunks(case_id, query_embedding, limit)
+    search_params = models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            rescore=settings.qdrant_search_rescore if rescore is None else rescore,
+            oversampling=oversampling or settings.qdrant_search_oversampling,
+        )
     )
+    case_filter = models.Filter(
+        must=[models.FieldCondition(key="case_id", match=models.MatchValue(value=case_id))]
+    )
+    if query_text and _has_sparse and settings.retrieval_mode == "hybrid":
+        indices, values = sparse.query_vector(query_text)
+        candidates = limit * settings.hybrid_prefetch_multiplier
+        prefetch = [models.Prefetch(query=query_embedding, filter=case_filter, params=search_params, limit=candidates)]
+        if indices:
+            prefetch.append(models.Prefetch(
+                query=models.SparseVector(indices=indices, values=values),
+                using=SPARSE_VECTOR,
+                filter=case_filter,
+                limit=candidates,
+            ))
+        results = await get_client().query_points(
+            collection_name=settings.qdrant_collection,
+            prefetch=prefetch,
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=limit,
+            with_payload=True,
+        )
+    else:
+        results = await get_client().query_points(
+            collection_name=settings.qdrant_collection,
+            query=query_embedding,
+            query_filter=case_filter,
+            search_params=search_params,
+            limit=limit,
+            with_payload=True,
+        )
     return [
         {
             "score": point.score,
@@ -72,9 +250,11 @@ def search_chunks(case_id: str, query_embedding: list[float], top_k: int | None
     ]
 
 
-def delete_document_vectors(document_id: str):
+async def delete_document_vectors(document_id: str):
     """Delete all vectors for a given document."""
-    client.delete(
+    if _use_numpy():
+        return await numpy_index.delete_document_vectors(document_id)
+    await get_client().delete(
         collection_name=settings.qdrant_collection,
         points_selector=models.FilterSelector(
             filter=models.Filter(
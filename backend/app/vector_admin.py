@@ -0,0 +1,45 @@
+"""
+Vector store maintenance commands:
+
+    python -m app.vector_admin quantize    # apply QDRANT_QUANTIZATION to the existing collection
+    python -m app.vector_admin compact     # drop deleted documents from the numpy backend's segments
+"""
+import argparse
+import asyncio
+import logging
+
+from app.config import settings
+from app.services import numpy_index, vector_store
+
+logger = logging.getLogger("app.vector_admin")
+
+
+async def quantize() -> None:
+    await vector_store.apply_quantization()
+    logger.info(f"Applied {settings.qdrant_quantization} quantization to {settings.qdrant_collection}")
+
+
+async def compact() -> None:
+    removed = await numpy_index.compact()
+    logger.info(f"Compacted numpy vector index, removed {removed} rows")
+
+
+COMMANDS = {
+    "quantize": quantize,
+    "compact": compact,
+}
+
+
+async def main(command: str) -> None:
+    await vector_store.init_client()
+    try:
+        await COMMANDS[command]()
+    finally:
+        await vector_store.close_client()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    parser = argparse.ArgumentParser(prog="python -m app.vector_admin")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    asyncio.run(main(parser.parse_args().command))
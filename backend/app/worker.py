@@ -0,0 +1,44 @@
+"""
+Standalone ingestion worker, for running ingestion outside the API process:
+
+    INGESTION_IN_PROCESS_WORKERS=false uvicorn app.main:app
+    python -m app.worker
+"""
+import asyncio
+import logging
+import signal
+
+from app.config import settings
+from app.services import extraction, ollama, vector_store
+from app.services.jobs import IngestionWorkerPool
+
+logger = logging.getLogger("app.worker")
+
+
+async def main() -> None:
+    await ollama.init_client()
+    ollama.start_keep_warm(chat=False, warm_up_first=settings.ollama_warmup_on_startup)
+    await vector_store.init_client()
+    await vector_store.init_collection()
+    workers = IngestionWorkerPool(settings.ingestion_concurrency)
+    await workers.start()
+    logger.info(f"Ingestion worker started with concurrency {workers.concurrency}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await workers.stop()
+        await ollama.stop_keep_warm()
+        await ollama.close_client()
+        await vector_store.close_client()
+        extraction.shutdown_executor()
+        logger.info("Ingestion worker stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    asyncio.run(main())
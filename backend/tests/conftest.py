@@ -0,0 +1,4 @@
+import os
+
+# Settings are loaded at import time and refuse to start without a real secret
+os.environ.setdefault("SECRET_KEY", "test-secret-key-that-is-at-least-32-characters")
@@ -0,0 +1,107 @@
+import pytest
+
+from app.config import settings
+from app.services.chunking import ChunkStream, chunk_pages
+
+PAGES = [
+    {"page": 1, "text": "The lease began in March. Rent was due monthly! Was it paid? The tenant says yes."},
+    {"page": 2, "text": "Receipts were kept.  The landlord disputes this. No notice was served"},
+    {"page": 4, "text": "Trial is set for June."},
+]
+
+# (text, page_numbers, chunk_index), as produced by the original per-character chunker
+EXPECTED = {
+    (40, 8): [
+        ("The lease began in March.", [1], 0),
+        ("March. Rent was due monthly!", [1], 1),
+        ("onthly! Was it paid?", [1], 2),
+        ("t paid? The tenant says yes.", [1], 3),
+        ("ys yes. Receipts were kept.", [1, 2], 4),
+        ("kept.  The landlord disputes this.", [2], 5),
+        ("s this. No notice was served Trial is se", [2, 4], 6),
+        ("al is set for June.", [4], 7),
+    ],
+    (64, 0): [
+        ("The lease began in March. Rent was due monthly! Was it paid?", [1], 0),
+        ("The tenant says yes. Receipts were kept.", [1, 2], 1),
+        ("The landlord disputes this. No notice was served Trial is set fo", [2, 4], 2),
+        ("r June.", [4], 3),
+    ],
+    # Overlap of exactly half the chunk size
+    (30, 15): [
+        ("The lease began in March.", [1], 0),
+        ("egan in March. Rent was due mo", [1], 1),
+        ("Rent was due monthly!", [1], 2),
+        ("s due monthly! Was it paid?", [1], 3),
+        ("! Was it paid? The tenant says", [1], 4),
+        ("The tenant says yes.", [1], 5),
+        ("nant says yes. Receipts were k", [1, 2], 6),
+        ("Receipts were kept.", [2], 7),
+        ("ts were kept.  The landlord di", [2], 8),
+        ("The landlord disputes this.", [2], 9),
+        ("disputes this. No notice was s", [2], 10),
+        ("No notice was served Trial is", [2, 4], 11),
+        ("erved Trial is set for June.", [2, 4], 12),
+    ],
+    (500, 64): [
+        (
+            "The lease began in March. Rent was due monthly! Was it paid? The tenant says yes. "
+            "Receipts were kept.  The landlord disputes this. No notice was served Trial is set for June.",
+            [1, 2, 4],
+            0,
+        ),
+    ],
+}
+
+
+@pytest.fixture
+def chunking(monkeypatch):
+    def configure(size: int, overlap: int):
+        monkeypatch.setattr(settings, "chunk_size", size)
+        monkeypatch.setattr(settings, "chunk_overlap", overlap)
+
+    return configure
+
+
+def _as_tuples(chunks):
+    return [(c.text, c.page_numbers, c.chunk_index) for c in chunks]
+
+
+@pytest.mark.parametrize("size,overlap", list(EXPECTED))
+def test_chunk_pages_unchanged(chunking, size, overlap):
+    chunking(size, overlap)
+    assert _as_tuples(chunk_pages(PAGES)) == EXPECTED[(size, overlap)]
+
+
+@pytest.mark.parametrize("size,overlap", list(EXPECTED))
+def test_stream_matches_whole_document(chunking, size, overlap):
+    chunking(size, overlap)
+    stream = ChunkStream()
+    chunks = []
+    for page in PAGES:
+        chunks.extend(stream.feed(page))
+    chunks.extend(stream.finish())
+    assert _as_tuples(chunks) == EXPECTED[(size, overlap)]
+
+
+def test_overlap_longer_than_snapped_chunk_still_advances(chunking):
+    # The original chunker looped forever here: a sentence-snapped chunk shorter than
+    # the overlap sent the next chunk back to (or before) its own start
+    chunking(20, 20)
+    assert _as_tuples(chunk_pages(PAGES)) == [
+        ("The lease began in M", [1], 0),
+        ("arch. Rent was due m", [1], 1),
+        ("onthly! Was it paid?", [1], 2),
+        ("The tenant says yes", [1], 3),
+        (". Receipts were kept", [1, 2], 4),
+        (".  The landlord disp", [2], 5),
+        ("utes this.", [2], 6),
+        ("No notice was served", [2], 7),
+        ("Trial is set for Ju", [2, 4], 8),
+        ("ne.", [4], 9),
+    ]
+
+
+def test_blank_pages_produce_no_chunks(chunking):
+    chunking(40, 8)
+    assert chunk_pages([{"page": 1, "text": "   "}, {"page": 2, "text": ""}]) == []
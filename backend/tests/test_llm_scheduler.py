@@ -0,0 +1,87 @@
+import pytest
+
+from app.services.llm_scheduler import LLMScheduler, SchedulerOverloaded
+
+
+def _granted(*tickets):
+    return [t.granted for t in tickets]
+
+
+def test_grants_directly_while_slots_are_free():
+    scheduler = LLMScheduler(concurrency=2, max_queue=8, max_queue_per_user=4)
+    a = scheduler.enqueue("a")
+    b = scheduler.enqueue("b")
+    c = scheduler.enqueue("c")
+    assert _granted(a, b, c) == [True, True, False]
+    assert [a.position(), b.position(), c.position()] == [0, 0, 1]
+
+
+def test_directly_granted_user_goes_behind_waiting_users():
+    scheduler = LLMScheduler(concurrency=1, max_queue=8, max_queue_per_user=4)
+    a1 = scheduler.enqueue("a")
+    a2 = scheduler.enqueue("a")
+    a3 = scheduler.enqueue("a")
+    b = scheduler.enqueue("b")
+    assert [a2.position(), b.position(), a3.position()] == [2, 1, 3]
+
+    a1.release()
+    assert _granted(a2, b, a3) == [False, True, False]
+    assert [a2.position(), a3.position()] == [1, 2]
+
+    b.release()
+    assert a2.granted and a3.position() == 1
+
+
+def test_round_robin_between_users():
+    scheduler = LLMScheduler(concurrency=1, max_queue=8, max_queue_per_user=4)
+    holder = scheduler.enqueue("x")
+    a1, a2, a3 = (scheduler.enqueue("a") for _ in range(3))
+    b1, b2 = (scheduler.enqueue("b") for _ in range(2))
+    c1 = scheduler.enqueue("c")
+    expected = [a1, b1, c1, a2, b2, a3]
+    assert [t.position() for t in expected] == [1, 2, 3, 4, 5, 6]
+
+    order = []
+    current = holder
+    for _ in expected:
+        current.release()
+        current = next(t for t in expected if t.granted and not t.released)
+        order.append(current)
+    assert order == expected
+
+
+def test_background_waits_for_interactive_requests():
+    scheduler = LLMScheduler(concurrency=1, max_queue=8, max_queue_per_user=4)
+    a1 = scheduler.enqueue("a")
+    background = scheduler.enqueue_background()
+    a2 = scheduler.enqueue("a")
+    assert background.position() == 2
+
+    a1.release()
+    assert _granted(a2, background) == [True, False]
+    a2.release()
+    assert background.granted
+
+
+def test_cancelled_ticket_leaves_the_queue():
+    scheduler = LLMScheduler(concurrency=1, max_queue=8, max_queue_per_user=4)
+    holder = scheduler.enqueue("a")
+    b = scheduler.enqueue("b")
+    c = scheduler.enqueue("c")
+    b.release()
+    assert c.position() == 1
+    holder.release()
+    assert c.granted and not b.granted
+
+
+def test_rejects_when_queues_are_full():
+    scheduler = LLMScheduler(concurrency=1, max_queue=3, max_queue_per_user=2)
+    scheduler.enqueue("a")
+    scheduler.enqueue("a")
+    scheduler.enqueue("a")
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.enqueue("a")
+    scheduler.enqueue("b")
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.enqueue("c")
+    assert scheduler.stats()["rejected_total"] == 2
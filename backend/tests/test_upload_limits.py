@@ -0,0 +1,67 @@
+from fastapi import FastAPI, UploadFile
+from fastapi.testclient import TestClient
+
+from app.middleware import UploadSizeLimitMiddleware
+from app.routers.documents import _stream_upload
+
+FILE_LIMIT = 4000
+REQUEST_LIMIT = 20_000
+
+
+def _client(tmp_path) -> TestClient:
+    """An upload endpoint with the production request cap and per-file checks."""
+    app = FastAPI()
+
+    @app.post("/cases/c1/documents")
+    async def upload(files: list[UploadFile]):
+        sizes = []
+        for file in files:
+            _, size, _ = await _stream_upload(file, str(tmp_path), FILE_LIMIT)
+            sizes.append(size)
+        return sizes
+
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=REQUEST_LIMIT)
+    return TestClient(app)
+
+
+def _pdf(size: int) -> bytes:
+    return b"%PDF-" + b"x" * (size - 5)
+
+
+def test_several_files_within_the_per_file_limit_are_accepted(tmp_path):
+    # Together they exceed the per-file limit, which only applies to each file
+    files = [("files", (f"exhibit-{i}.pdf", _pdf(3000))) for i in range(4)]
+    response = _client(tmp_path).post("/cases/c1/documents", files=files)
+    assert response.status_code == 200
+    assert response.json() == [3000] * 4
+
+
+def test_one_file_over_the_per_file_limit_is_rejected(tmp_path):
+    files = [("files", ("small.pdf", _pdf(1000))), ("files", ("big.pdf", _pdf(FILE_LIMIT + 1)))]
+    response = _client(tmp_path).post("/cases/c1/documents", files=files)
+    assert response.status_code == 413
+    assert "big.pdf" in response.json()["detail"]
+
+
+def test_request_over_the_request_limit_is_rejected_before_parsing(tmp_path):
+    files = [("files", (f"exhibit-{i}.pdf", _pdf(3000))) for i in range(8)]
+    response = _client(tmp_path).post("/cases/c1/documents", files=files)
+    assert response.status_code == 413
+    assert "request" in response.json()["detail"]
+
+
+def test_chunked_request_is_cut_off_at_the_request_limit(tmp_path):
+    client = _client(tmp_path)
+    request = client.build_request(
+        "POST", "/cases/c1/documents", files=[("files", (f"e{i}.pdf", _pdf(3000))) for i in range(8)]
+    )
+    body = request.read()
+
+    def chunks():
+        for i in range(0, len(body), 1024):
+            yield body[i:i + 1024]
+
+    response = client.post(
+        "/cases/c1/documents", content=chunks(), headers={"content-type": request.headers["content-type"]}
+    )
+    assert response.status_code == 413
@@ -151,11 +151,11 @@ export const exportConversation = async (convId: string, format: 'pdf' | 'markdo
   URL.revokeObjectURL(url)
 }
 
-export const sendMessage = async (convId: string, content: string) => {
+export const sendMessage = async (convId: string, content: string, useAnswerCache = false) => {
   const res = await fetch(`${BASE}/conversations/${convId}/messages`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json', ...authHeaders() },
-    body: JSON.stringify({ content }),
+    body: JSON.stringify({ content, use_answer_cache: useAnswerCache }),
   })
   if (!res.ok) {
     if (res.status === 401) handleUnauthorized('/conversations')
@@ -163,3 +163,42 @@ export const sendMessage = async (convId: string, content: string) => {
   }
   return res
 }
+
+// Reattach to an answer whose stream dropped, replaying the events after lastEventId
+export const resumeStream = async (convId: string, generationId: string, lastEventId: string | null) => {
+  const res = await fetch(`${BASE}/conversations/${convId}/stream?resume=${generationId}`, {
+    headers: { ...authHeaders(), ...(lastEventId ? { 'Last-Event-ID': lastEventId } : {}) },
+  })
+  if (!res.ok) {
+    if (res.status === 401) handleUnauthorized('/conversations')
+    throw new Error(`Resume failed: ${res.status}`)
+  }
+  return res
+}
+
+export const subscribeConversationEvents = async (
+  convId: string,
+  onEvent: (event: { type: string; [key: string]: unknown }) => void,
+  signal: AbortSignal,
+) => {
+  const res = await fetch(`${BASE}/conversations/${convId}/events`, { headers: authHeaders(), signal })
+  if (!res.ok || !res.body) return
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n')
+    buffer = lines.pop() || ''
+    for (const line of lines) {
+      if (!line.startsWith('data: ')) continue
+      try {
+        onEvent(JSON.parse(line.slice(6)))
+      } catch {
+        // skip malformed lines
+      }
+    }
+  }
+}
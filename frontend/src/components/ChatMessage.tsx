@@ -52,10 +52,14 @@ export default function ChatMessage({
   role,
   content,
   citations = [],
+  interrupted = false,
+  error = null,
 }: {
   role: 'user' | 'assistant'
   content: string
   citations?: Citation[]
+  interrupted?: boolean
+  error?: string | null
 }) {
   const isUser = role === 'user'
 
@@ -73,6 +77,10 @@ export default function ChatMessage({
         ) : (
           <div className="text-sm">{renderContentWithCitations(content, citations)}</div>
         )}
+        {error && <p className="mt-2 text-xs text-red-600">{error}</p>}
+        {interrupted && (
+          <p className="mt-2 text-xs italic text-slate-400">Response interrupted before it finished.</p>
+        )}
       </div>
     </div>
   )
@@ -1,7 +1,7 @@
 import { useState, useRef, useEffect } from 'react'
 import { useParams } from 'react-router-dom'
 import { useQuery, useQueryClient } from '@tanstack/react-query'
-import { getMessages, exportConversation } from '../api/client'
+import { getMessages, exportConversation, subscribeConversationEvents } from '../api/client'
 import { useChat } from '../hooks/useChat'
 import ChatMessage from './ChatMessage'
 import type { Message } from '../types'
@@ -10,6 +10,7 @@ export default function ChatWindow() {
   const { convId } = useParams<{ convId: string }>()
   const queryClient = useQueryClient()
   const [input, setInput] = useState('')
+  const [useAnswerCache, setUseAnswerCache] = useState(false)
   const bottomRef = useRef<HTMLDivElement>(null)
   const inputRef = useRef<HTMLInputElement>(null)
 
@@ -33,7 +34,7 @@ export default function ChatWindow() {
     }
   }
 
-  const { streamingContent, isStreaming, citations, send } = useChat(() => {
+  const { streamingContent, isStreaming, citations, queuePosition, send } = useChat(() => {
     queryClient.invalidateQueries({ queryKey: ['messages', convId] })
     queryClient.invalidateQueries({ queryKey: ['conversations'] })
   })
@@ -46,6 +47,24 @@ export default function ChatWindow() {
     inputRef.current?.focus()
   }, [convId])
 
+  // Titles are generated after the answer finishes streaming and pushed here
+  useEffect(() => {
+    if (!convId) return
+    const controller = new AbortController()
+    subscribeConversationEvents(
+      convId,
+      (event) => {
+        if (event.type === 'title') {
+          queryClient.invalidateQueries({ queryKey: ['conversations'] })
+        }
+      },
+      controller.signal,
+    ).catch(() => {
+      // aborted on navigation, or the server went away
+    })
+    return () => controller.abort()
+  }, [convId, queryClient])
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault()
     if (!input.trim() || isStreaming || !convId) return
@@ -55,7 +74,7 @@ export default function ChatWindow() {
       ...(old || []),
       { id: 'temp', conversation_id: convId, role: 'user' as const, content, citations: [], created_at: new Date().toISOString() },
     ])
-    await send(convId, content)
+    await send(convId, content, useAnswerCache)
   }
 
   if (!convId) return null
@@ -87,7 +106,14 @@ export default function ChatWindow() {
           </div>
         )}
         {messages?.map((msg: Message) => (
-          <ChatMessage key={msg.id} role={msg.role} content={msg.content} citations={msg.citations} />
+          <ChatMessage
+            key={msg.id}
+            role={msg.role}
+            content={msg.content}
+            citations={msg.citations}
+            interrupted={msg.interrupted}
+            error={msg.error}
+          />
         ))}
         {isStreaming && streamingContent && (
           <ChatMessage role="assistant" content={streamingContent} citations={citations} />
@@ -99,6 +125,9 @@ export default function ChatWindow() {
                 <div className="w-2 h-2 bg-slate-400 rounded-full animate-bounce" style={{ animationDelay: '0ms' }} />
                 <div className="w-2 h-2 bg-slate-400 rounded-full animate-bounce" style={{ animationDelay: '150ms' }} />
                 <div className="w-2 h-2 bg-slate-400 rounded-full animate-bounce" style={{ animationDelay: '300ms' }} />
+                {queuePosition !== null && (
+                  <span className="ml-2 text-xs text-slate-500">Waiting in queue (position {queuePosition})</span>
+                )}
               </div>
             </div>
           </div>
@@ -125,6 +154,15 @@ export default function ChatWindow() {
             Send
           </button>
         </div>
+        <label className="flex items-center gap-2 mt-2 text-xs text-slate-500">
+          <input
+            type="checkbox"
+            checked={useAnswerCache}
+            onChange={(e) => setUseAnswerCache(e.target.checked)}
+            className="rounded border-slate-300"
+          />
+          Reuse a saved answer if this exact question was already asked on this case
+        </label>
       </form>
     </div>
   )
@@ -41,8 +41,15 @@ export default function DocumentList({ caseId }: { caseId: string }) {
             <span className={`px-2 py-0.5 rounded-full text-xs font-medium ${STATUS_STYLES[doc.status]}`}>
               {doc.status}
             </span>
-            {doc.page_count !== null && (
-              <span className="text-slate-400 text-xs">{doc.page_count} pages</span>
+            {doc.status === 'processing' ? (
+              <span className="text-slate-400 text-xs">
+                {doc.pages_extracted} pages read, {doc.chunks_embedded}
+                {doc.chunks_total !== null && ` / ${doc.chunks_total}`} chunks indexed
+              </span>
+            ) : (
+              doc.page_count !== null && (
+                <span className="text-slate-400 text-xs">{doc.page_count} pages</span>
+              )
             )}
           </div>
           <button
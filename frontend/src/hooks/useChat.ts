@@ -1,63 +1,116 @@
 import { useState, useCallback } from 'react'
-import { sendMessage } from '../api/client'
+import { resumeStream, sendMessage } from '../api/client'
 import type { Citation } from '../types'
 
+// Reattach attempts after the stream drops before the answer is done
+const MAX_RESUME_ATTEMPTS = 5
+const RESUME_DELAY_MS = 1000
+
 interface UseChatReturn {
   streamingContent: string
   isStreaming: boolean
   citations: Citation[]
-  send: (convId: string, content: string) => Promise<void>
+  queuePosition: number | null
+  send: (convId: string, content: string, useAnswerCache?: boolean) => Promise<void>
 }
 
 export function useChat(onComplete: () => void): UseChatReturn {
   const [streamingContent, setStreamingContent] = useState('')
   const [isStreaming, setIsStreaming] = useState(false)
   const [citations, setCitations] = useState<Citation[]>([])
+  const [queuePosition, setQueuePosition] = useState<number | null>(null)
 
   const send = useCallback(
-    async (convId: string, content: string) => {
+    async (convId: string, content: string, useAnswerCache = false) => {
       setIsStreaming(true)
       setStreamingContent('')
       setCitations([])
 
-      try {
-        const res = await sendMessage(convId, content)
+      let lastEventId: string | null = null
+      let finished = false
+
+      // Read SSE frames until the stream ends or drops
+      const readStream = async (res: Response) => {
         const reader = res.body?.getReader()
         if (!reader) return
 
         const decoder = new TextDecoder()
         let buffer = ''
 
-        while (true) {
-          const { done, value } = await reader.read()
-          if (done) break
-
-          buffer += decoder.decode(value, { stream: true })
-          const lines = buffer.split('\n')
-          buffer = lines.pop() || ''
-
-          for (const line of lines) {
-            if (!line.startsWith('data: ')) continue
-            try {
-              const data = JSON.parse(line.slice(6))
-              if (data.type === 'token') {
-                setStreamingContent((prev) => prev + data.content)
-              } else if (data.type === 'done') {
-                setCitations(data.citations || [])
+        try {
+          while (true) {
+            const { done, value } = await reader.read()
+            if (done) break
+
+            buffer += decoder.decode(value, { stream: true })
+            const lines = buffer.split('\n')
+            buffer = lines.pop() || ''
+
+            for (const line of lines) {
+              if (line.startsWith('id: ')) {
+                lastEventId = line.slice(4)
+                continue
+              }
+              if (!line.startsWith('data: ')) continue
+              try {
+                const data = JSON.parse(line.slice(6))
+                if (data.type === 'queued') {
+                  setQueuePosition(data.position)
+                } else if (data.type === 'token') {
+                  setQueuePosition(null)
+                  setStreamingContent((prev) => prev + data.content)
+                } else if (data.type === 'citation') {
+                  // Sources arrive as soon as the answer first cites them
+                  const citation: Citation = {
+                    source_index: data.source_index,
+                    document_name: data.document_name,
+                    page_numbers: data.page_numbers,
+                    snippet: data.snippet,
+                  }
+                  setCitations((prev) =>
+                    prev.some((c) => c.source_index === citation.source_index) ? prev : [...prev, citation],
+                  )
+                } else if (data.type === 'done') {
+                  setCitations(data.citations || [])
+                  finished = true
+                } else if (data.type === 'error') {
+                  // The answer failed on the server; the saved message carries the error
+                  finished = true
+                }
+              } catch {
+                // skip malformed lines
               }
-            } catch {
-              // skip malformed lines
             }
           }
+        } catch {
+          // connection dropped; the caller resumes
+        }
+      }
+
+      try {
+        const res = await sendMessage(convId, content, useAnswerCache)
+        const generationId = res.headers.get('X-Generation-Id')
+        await readStream(res)
+
+        // The answer keeps generating on the server; pick up after the last event seen
+        for (let attempt = 0; !finished && generationId && attempt < MAX_RESUME_ATTEMPTS; attempt++) {
+          await new Promise((resolve) => setTimeout(resolve, RESUME_DELAY_MS))
+          try {
+            await readStream(await resumeStream(convId, generationId, lastEventId))
+          } catch {
+            // not resumable any more; the saved message is shown on refresh
+            break
+          }
         }
       } finally {
         setIsStreaming(false)
         setStreamingContent('')
+        setQueuePosition(null)
         onComplete()
       }
     },
     [onComplete],
   )
 
-  return { streamingContent, isStreaming, citations, send }
+  return { streamingContent, isStreaming, citations, queuePosition, send }
 }
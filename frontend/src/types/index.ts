@@ -22,6 +22,9 @@ export interface Document {
   filename: string
   file_size: number
   page_count: number | null
+  pages_extracted: number
+  chunks_embedded: number
+  chunks_total: number | null
   status: 'pending' | 'processing' | 'completed' | 'failed'
   error_message: string | null
   created_at: string
@@ -48,5 +51,7 @@ export interface Message {
   role: 'user' | 'assistant'
   content: string
   citations: Citation[]
+  interrupted?: boolean
+  error?: string | null
   created_at: string
 }